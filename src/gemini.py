@@ -1,26 +1,206 @@
 import sys
 import os
+import atexit
 import re
+import time
 import sqlite3
-from datetime import datetime
-from PyQt5.QtWidgets import QApplication, QDialog, QMessageBox, QFileDialog, QLabel
-from PyQt5.uic import loadUi
-from PyQt5.QtGui import QPixmap
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
-import base64
+import threading
+import mmap
+import mimetypes
+import hashlib
+from datetime import datetime, timedelta
+from PyQt5.QtWidgets import QApplication, QDialog, QMessageBox, QFileDialog
+from PyQt5.QtGui import QRegion, QTextCursor, QTextDocument
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal, pyqtSlot
+from collections import OrderedDict
+from functools import lru_cache, partial
+
+try:
+    from ui_gemini import Ui_Dialog # pyuic5 gemini.ui -o ui_gemini.py 로 미리 컴파일한 UI 클래스
+except ImportError:
+    Ui_Dialog = object # 컴파일된 파일이 없으면 실행 시 gemini.ui를 직접 로드합니다.
 
 # ----------------------------------------------------------------------
 # 1. 설정 및 전역 변수 (Configuration)
 # ----------------------------------------------------------------------
-load_dotenv()
-API_KEY = os.environ.get("GEMINI_API_KEY")
 DB_NAME = 'chat_data.db'
+EMBEDDING_MODEL = 'gemini-embedding-001'
+EMBEDDING_DIM = 768
+SEMANTIC_CACHE_THRESHOLD = 0.85 # 코사인 유사도 기준 (거리 0.15 미만이면 같은 질문으로 간주)
+SEMANTIC_CACHE_TTL_DAYS = 7
+SYSTEM_PROMPT_PREFIX = "이 대화의 시스템 지침은 다음과 같습니다: " # 세션 첫 user 턴 (팩트 전달용, 캐시 키 맥락에서는 제외)
+CHAT_CACHE_MODE = '대화' # 응답 캐시는 모드별로 따로 조회합니다. (같은 입력이라도 요약/코딩 답변은 다름)
+HISTORY_SEED_TURNS = 20 # 새 채팅 세션에 미리 넣어 둘 최근 대화 수
+EXPLICIT_CACHE_MIN_TOKENS = 2048 # 이 이상이면 시작 컨텍스트를 명시적 캐시(caches.create)로 등록
+CONTEXT_CACHE_TTL = "3600s" # 명시적 컨텍스트 캐시의 유지 시간 (만료되면 그 캐시를 쓰는 세션의 요청이 모두 실패)
+API_THREAD_COUNT = 8 # API 작업 스레드 수 (네트워크 대기 위주라 CPU 코어 수와 무관하게 여러 요청을 동시에 처리)
+CONTEXT_CACHE_REFRESH_MS = 45 * 60 * 1000 # 만료 전에 TTL을 다시 연장하는 주기 (45분)
+SEARCH_DEBOUNCE_MS = 150 # 검색 모드에서 입력이 멈춘 뒤 검색을 실행하기까지의 대기 시간
+SEARCH_CACHE_TTL = 60 # 검색 결과 메모 유지 시간(초)
+SEARCH_CACHE_SIZE = 64
+FACTS_RESET_DELAY_MS = 500 # 팩트를 연달아 수정할 때 마지막 수정 후 한 번만 세션을 재설정하기까지의 대기 시간
+DB_OPTIMIZE_INTERVAL_MS = 30 * 60 * 1000 # 오래 켜 둔 세션에서 플래너 통계를 갱신하는 주기 (30분)
+PROMPT_CACHE_SIZE = 256 # 입력이 완전히 같은 단발 요청(요약·코딩·데이터 분석)의 답변을 기억하는 메모리 LRU 캐시 크기
+DB_FLUSH_BATCH_SIZE = 16 # 쓰기 대기열이 이만큼 쌓이면 타이머를 기다리지 않고 바로 커밋
+DB_MAX_CONNECTIONS = min(4, os.cpu_count() or 1) # 스레드별로 여는 DB 연결 수 상한 (넘으면 첫 연결을 함께 사용)
+_RESULT_HEADER = "[fox]: ✅ **{title}**\n" # 단발 요청 결과의 제목 줄 (요청마다 한 번만 format)
+_CACHED_RESULT_HEADER = "[fox]: ✅ **{title}** (💾 저장된 답변)\n"
+# 작업 스레드가 보낸 예외 클래스명 → 미리 만들어 둔 안내 문구 (목록에 없으면 클래스명을 그대로 표시)
+# "… API 호출 중 오류 발생: " 뒤에 붙여 표시합니다.
+_API_ERROR_MESSAGES = {
+    "ClientError": "API 요청이 거부되었습니다. (API 키, 요청 내용 또는 사용량 한도를 확인하세요)",
+    "ServerError": "Gemini 서버 오류가 발생했습니다. 잠시 후 다시 시도하세요.",
+    "ConnectError": "네트워크에 연결할 수 없습니다.",
+    "ConnectionError": "네트워크에 연결할 수 없습니다.",
+    "ReadTimeout": "응답 시간이 초과되었습니다.",
+    "TimeoutError": "응답 시간이 초과되었습니다.",
+}
+# 입력 하나로 단발 요청을 보내는 모드의 설정 (_run_llm_task가 이 표만 보고 같은 흐름으로 처리)
+# log/prompt/save_question의 {text}는 입력 전체, {head}는 앞 100자입니다.
+# cache가 True면 입력이 완전히 같은 요청의 답변을 재사용하고, semantic_cache가 True면 임베딩이 비슷한 입력의 답변까지 재사용합니다.
+# 숫자나 세부 조건만 다른 입력도 임베딩은 비슷하므로, 답변이 입력 세부에 좌우되는 코딩·데이터 분석은 완전 일치만 사용합니다.
+_LLM_TASKS = {
+    "요약": {
+        'empty_message': "⚠️ 요약할 텍스트를 입력해주세요.",
+        'log': "[요약 요청]: {head}...",
+        'pending': "[fox]: 📝 텍스트를 요약하는 중...",
+        'prompt': "다음 텍스트를 핵심만 간결하게 요약하세요: {text}",
+        'system_instruction': None,
+        'web_search': False,
+        'save_question': "[요약 요청] {text}",
+        'save_answer': "[요약 응답]",
+        'title': "요약 결과",
+        'error_label': "요약",
+        'cache': True,
+        'semantic_cache': True,
+    },
+    "코딩": {
+        'empty_message': "⚠️ 생성할 코드를 설명해주세요.",
+        'log': "[코드 요청]: {head}...",
+        'pending': "[fox]: 🧑‍💻 코드를 생성하는 중...",
+        'prompt': "{text}",
+        'system_instruction': "당신은 Python 전문가입니다. 요청에 따라 코드와 설명을 Markdown 코드 블록으로 작성하세요.",
+        'web_search': False,
+        'save_question': "[코드 요청] {text}",
+        'save_answer': "[코드 응답]",
+        'title': "코드 생성 결과",
+        'error_label': "코드",
+        'cache': True,
+        'semantic_cache': False,
+    },
+    "웹 검색": {
+        'empty_message': "⚠️ 웹 검색 키워드를 입력해주세요.",
+        'log': "[웹 검색 요청]: {text}",
+        'pending': "[fox]: 🌐 웹 검색을 수행하는 중...",
+        'prompt': "{text}",
+        'system_instruction': None,
+        'web_search': True,
+        'save_question': "[웹 검색 요청] {text}",
+        'save_answer': "[웹 검색 응답]",
+        'title': "웹 검색 결과",
+        'error_label': "웹 검색",
+        'cache': False,
+        'semantic_cache': False,
+    },
+    "데이터 분석": {
+        'empty_message': "⚠️ 분석할 데이터(표, 리스트 등)와 질문을 함께 입력해주세요.",
+        'log': "[데이터 분석 요청]: {head}...",
+        'pending': "[fox]: 📊 데이터 분석을 수행하는 중...",
+        'prompt': "{text}",
+        'system_instruction': "당신은 데이터 분석 전문가입니다. 주어진 데이터를 분석하고 사용자의 질문에 답변하세요. 통계적 사실은 굵은 글씨로 강조하세요.",
+        'web_search': False,
+        'save_question': "[데이터 분석 요청] {text}",
+        'save_answer': "[데이터 분석 응답]",
+        'title': "데이터 분석 결과",
+        'error_label': "데이터 분석",
+        'cache': True,
+        'semantic_cache': False,
+    },
+    "에이전트 워크플로우": {
+        'empty_message': "⚠️ 에이전트 워크플로우: 다단계 작업을 정의하세요.",
+        'log': "**[에이전트 워크플로우 요청]:** {head}...",
+        'pending': "[fox]: ⚙️ 워크플로우를 분석하고 실행합니다. (Google Search 포함 가능)",
+        'prompt': "{text}",
+        'system_instruction': (
+            "당신은 다단계 작업을 처리하는 에이전트입니다. 사용자의 요청을 '단계별'로 분해하고 순차적으로 처리하세요.\n"
+            "각 단계의 결과를 다음 단계의 입력으로 사용해야 합니다. 최종 결과만 출력합니다.\n"
+            "웹 검색이 필요한 단계에는 Google Search Tool을 사용하세요."
+        ),
+        'web_search': True,
+        'save_question': "[워크플로우 요청] {text}",
+        'save_answer': "[워크플로우 응답]",
+        'title': "워크플로우 최종 결과",
+        'error_label': "워크플로우",
+        'cache': False,
+        'semantic_cache': False,
+    },
+}
+_DELETE_RE = re.compile(r'지워줘|삭제|취소') # 최근 기록 삭제 명령 키워드 (입력을 한 번만 훑음)
+# 파일을 첨부하는 모드와 업로드 대화상자의 파일 필터 (여기 있는 모드에서만 파일 위젯을 표시)
+_MODE_FILE_FILTERS = {
+    "이미지 분석": "Images (*.png *.jpg *.jpeg *.bmp *.webp)",
+    # CSV, 텍스트 등 데이터 파일 형식을 지원
+    "데이터 분석": "Data Files (*.csv *.txt *.json);;Images (*.png *.jpg *.jpeg);;All Files (*)",
+}
+
+
+@lru_cache(maxsize=None)
+def get_api_key():
+    """.env를 처음 필요할 때 한 번만 읽어 GEMINI_API_KEY를 반환합니다."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.environ.get("GEMINI_API_KEY")
+
+
+def api_error_message(error_name):
+    """작업 스레드가 보낸 예외 클래스명을 "API 호출 중 오류 발생: " 뒤에 표시할 설명으로 바꿉니다."""
+    return _API_ERROR_MESSAGES.get(error_name, error_name)
 
 # ----------------------------------------------------------------------
 # 2. 데이터베이스 모듈 (SQLiteChatDatabase Class)
 # ----------------------------------------------------------------------
+class ResponseCacheIndex:
+    """
+    한 모드의 시맨틱 캐시 임베딩을 하나의 연속된 float32 행렬로 보관합니다.
+    조회 시 (행렬 @ 질문 벡터) 한 번으로 모든 캐시 항목과의 코사인 유사도를 계산합니다.
+    """
+    def __init__(self, dim=EMBEDDING_DIM, capacity=16):
+        import numpy as np # numpy는 시작 시간에 비해 무거워 캐시를 처음 쓸 때 불러옵니다.
+
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.created = np.empty(capacity, dtype=np.float64) # 저장 시각 (epoch 초)
+        self.answers = []
+        self.size = 0
+
+    def add(self, embedding, answer, created_ts):
+        """임베딩 한 행을 추가합니다. 용량이 차면 두 배로 늘려, 추가할 때마다 전체를 복사하지 않습니다."""
+        import numpy as np
+
+        if self.size == len(self.matrix):
+            matrix = np.empty((self.size * 2, self.matrix.shape[1]), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            created = np.empty(self.size * 2, dtype=np.float64)
+            created[:self.size] = self.created[:self.size]
+            self.matrix, self.created = matrix, created
+        self.matrix[self.size] = embedding
+        self.created[self.size] = created_ts
+        self.answers.append(answer)
+        # 작업 스레드의 조회는 size까지만 읽으므로, 행을 다 기록한 뒤 마지막에 늘립니다.
+        self.size += 1
+
+    def find(self, embedding, threshold, min_created):
+        """min_created 이후에 저장된 항목 중 유사도가 threshold 이상인 가장 가까운 답변을 반환합니다. 없으면 None."""
+        import numpy as np
+
+        size = self.size
+        if size == 0:
+            return None
+        scores = self.matrix[:size] @ embedding
+        scores[self.created[:size] < min_created] = -1.0
+        best = int(np.argmax(scores))
+        return self.answers[best] if scores[best] >= threshold else None
+
+
 class SQLiteChatDatabase:
     """
     SQLite 데이터베이스 연결 및 채팅 기록 저장을 처리하는 클래스입니다.
@@ -29,53 +209,290 @@ class SQLiteChatDatabase:
         self.db_name = db_name
         self.history_table = "chat_history"
         self.facts_table = "user_facts"
+        self.fts_table = "chat_history_fts"
+        self.fts_enabled = False
+        self.cache_table = "response_cache"
+        self._cache_index = None # {모드: ResponseCacheIndex} (창이 뜬 뒤 load_response_cache()에서 로드)
+        self._write_queue = [] # 아직 커밋되지 않은 (질문, 답변) 기록
+        self._facts_prompt_cache = None # get_contextual_facts() 결과 (팩트 변경 시 무효화)
+        self._facts_map_cache = None # get_user_facts_map() 결과 (팩트 변경 시 무효화)
+        self._tls = threading.local() # 스레드마다 자기 연결을 보관 (WAL에서 읽기와 쓰기가 서로 막지 않음)
+        self._connections = [] # 지금까지 연 모든 연결 (종료 시 한꺼번에 닫음)
+        self._conn_lock = threading.Lock()
+        self._write_lock = threading.Lock() # 연결을 함께 쓰는 스레드끼리 트랜잭션이 섞이지 않도록 쓰기를 직렬화
+        self._closed = False
+        self._prepare_statements()
+        self._main_conn = self._make_conn()
         self._init_db_tables()
+        atexit.register(self.close) # 창을 거치지 않고 종료되는 경우에도 대기열 저장 및 연결 정리
+
+    def _prepare_statements(self):
+        """
+        자주 실행하는 SQL 문자열을 한 번만 만들어 둡니다.
+        매 호출마다 같은 문자열을 다시 조립하지 않고, sqlite3의 문장 캐시도 같은 객체로 적중합니다.
+        """
+        self._sql_insert_history = f"INSERT INTO {self.history_table} (question, answer, created_at) VALUES (?, ?, datetime('now', 'localtime'))"
+        self._sql_select_last_id = f"SELECT id FROM {self.history_table} ORDER BY id DESC LIMIT 1"
+        self._sql_delete_history = f"DELETE FROM {self.history_table} WHERE id = ?"
+        self._sql_select_facts = f"SELECT fact_key, fact_value FROM {self.facts_table}"
+        self._sql_upsert_fact = f"INSERT OR REPLACE INTO {self.facts_table} (fact_key, fact_value) VALUES (?, ?)"
+        self._sql_delete_fact = f"DELETE FROM {self.facts_table} WHERE fact_key = ?"
+        self._sql_insert_cache = f"INSERT INTO {self.cache_table} (mode, question, answer, embedding, created_at) VALUES (?, ?, ?, ?, ?)"
+        self._sql_search_fts = f"""
+            SELECT h.created_at,
+                   substr(h.question, 1, 100) || CASE WHEN length(h.question) > 100 THEN '...' ELSE '' END AS question,
+                   substr(h.answer, 1, 200) || CASE WHEN length(h.answer) > 200 THEN '...' ELSE '' END AS answer
+            FROM {self.fts_table} f
+            JOIN {self.history_table} h ON h.id = f.rowid
+            WHERE {self.fts_table} MATCH ?
+            ORDER BY bm25({self.fts_table})
+            LIMIT 50
+        """
+        self._sql_search_like = f"""
+            SELECT created_at,
+                   substr(question, 1, 100) || CASE WHEN length(question) > 100 THEN '...' ELSE '' END AS question,
+                   substr(answer, 1, 200) || CASE WHEN length(answer) > 200 THEN '...' ELSE '' END AS answer
+            FROM {self.history_table}
+            WHERE id IN (
+                SELECT id FROM {self.history_table} WHERE question LIKE ?
+                UNION
+                SELECT id FROM {self.history_table} WHERE answer LIKE ?
+            )
+            ORDER BY created_at DESC
+            LIMIT 50
+        """
+
+    @property
+    def conn(self):
+        """현재 스레드의 DB 연결을 반환합니다. (종료 후에는 None)"""
+        if self._closed:
+            return None
+        return self._get_connection()
 
     def _get_connection(self):
-        """DB 연결을 생성하고 반환합니다."""
+        """현재 스레드가 이미 연 연결을 재사용하고, 없으면 새로 엽니다."""
+        return getattr(self._tls, 'conn', None) or self._make_conn()
+
+    def _make_conn(self):
+        """
+        연결을 열고 PRAGMA를 적용한 뒤 현재 스레드에 보관합니다.
+        연결 수가 DB_MAX_CONNECTIONS에 이르면 새로 열지 않고 첫 연결을 함께 사용합니다.
+        """
+        with self._conn_lock:
+            if len(self._connections) >= DB_MAX_CONNECTIONS:
+                conn = self._main_conn
+            else:
+                try:
+                    # 호출마다 connect/close 하지 않고 스레드별 연결을 유지하여 페이지 캐시를 보존합니다.
+                    conn = sqlite3.connect(self.db_name, check_same_thread=False, isolation_level=None)
+                except sqlite3.Error as e:
+                    print(f"❌ SQLite 연결 오류: {e}")
+                    raise ConnectionError(f"SQLite 연결 실패: {e}")
+                # 행마다 dict를 만들지 않고 튜플 기반 Row로 row['컬럼'] 접근을 제공합니다. (튜플 언패킹도 그대로 동작)
+                conn.row_factory = sqlite3.Row
+                self._apply_pragmas(conn)
+                self._connections.append(conn)
+        self._tls.conn = conn
+        return conn
+
+    def _apply_pragmas(self, conn):
+        """WAL 저널링 등 성능 관련 PRAGMA를 연결에 적용합니다."""
+        try:
+            # WAL: 읽기(검색)와 쓰기(저장)가 서로 막지 않음 / NORMAL: 커밋마다 fsync 하지 않음
+            # cache_spill=OFF: 배치 저장 중 변경 페이지를 커밋 전에 디스크로 내보내지 않음
+            conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-64000;
+                PRAGMA cache_spill=OFF;
+                PRAGMA mmap_size=2147483648;
+                PRAGMA busy_timeout=5000;
+            """)
+        except sqlite3.Error as e:
+            print(f"⚠️ SQLite PRAGMA 설정 실패 (기본 설정으로 계속): {e}")
+
+    def close(self):
+        """대기 중인 기록을 저장하고 플래너 통계를 갱신한 뒤 열어 둔 모든 DB 연결을 닫습니다."""
+        if self._closed:
+            return
+        self.flush_pending()
+        self.optimize()
+        self._closed = True
+        with self._conn_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    def optimize(self, mask=0x12):
+        """
+        PRAGMA optimize로 필요한 테이블만 제한된 범위로 ANALYZE하여 sqlite_stat1을 최신으로 유지합니다.
+        종료 시에는 0x12, 실행 중 주기적으로는 모든 테이블을 살피는 0x10012를 사용합니다.
+        """
+        if not self.conn:
+            return
         try:
-            return sqlite3.connect(self.db_name)
+            self.conn.execute(f"PRAGMA optimize({mask:#x})")
         except sqlite3.Error as e:
-            print(f"❌ SQLite 연결 오류: {e}")
-            raise ConnectionError(f"SQLite 연결 실패: {e}")
+            print(f"⚠️ SQLite optimize 실패: {e}")
 
     def _init_db_tables(self):
         """필요한 테이블(history, facts)을 생성합니다."""
-        conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            cursor = self.conn.cursor()
             cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS {self.history_table} (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     question TEXT NOT NULL,
                     answer TEXT NOT NULL,
-                    created_at TEXT NOT NULL
+                    created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+                    CHECK (length(question) > 0 AND length(answer) > 0)
                 );
             """)
+            # 최신순 정렬(ORDER BY created_at DESC LIMIT n)을 임시 B-tree 정렬 없이 인덱스 순서로 처리
+            # 인덱스 항목에는 rowid(id)가 함께 저장되므로 id/created_at만 읽는 조회는 커버링 인덱스로 끝납니다.
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_chat_created ON {self.history_table}(created_at DESC)")
             cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS {self.facts_table} (
                     fact_key TEXT PRIMARY KEY,
                     fact_value TEXT NOT NULL
                 );
             """)
-            conn.commit()
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.cache_table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    created_at TEXT NOT NULL,
+                    mode TEXT NOT NULL DEFAULT '{CHAT_CACHE_MODE}'
+                );
+            """)
+            # 모드 구분 이전에 만들어진 캐시 테이블에는 mode 컬럼을 추가합니다. (기존 항목은 대화 모드)
+            cursor.execute(f"PRAGMA table_info({self.cache_table})")
+            if 'mode' not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute(f"ALTER TABLE {self.cache_table} ADD COLUMN mode TEXT NOT NULL DEFAULT '{CHAT_CACHE_MODE}'")
             print(f"✅ SQLite DB 테이블 초기화 완료: {self.db_name}")
 
         except Exception as e:
             print(f"❌ SQLite DB 초기화 실패: {e}")
-        finally:
-            if conn:
-                conn.close()
+
+        self._init_fts_table()
+
+    def _init_fts_table(self):
+        """chat_history를 미러링하는 FTS5 전문 검색 테이블과 동기화 트리거를 생성합니다."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.fts_table,))
+            is_new = cursor.fetchone() is None
+
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} USING fts5(
+                    question, answer,
+                    content='{self.history_table}', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+            """)
+            cursor.executescript(f"""
+                CREATE TRIGGER IF NOT EXISTS {self.history_table}_ai AFTER INSERT ON {self.history_table} BEGIN
+                    INSERT INTO {self.fts_table}(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+                END;
+                CREATE TRIGGER IF NOT EXISTS {self.history_table}_ad AFTER DELETE ON {self.history_table} BEGIN
+                    INSERT INTO {self.fts_table}({self.fts_table}, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+                END;
+                CREATE TRIGGER IF NOT EXISTS {self.history_table}_au AFTER UPDATE ON {self.history_table} BEGIN
+                    INSERT INTO {self.fts_table}({self.fts_table}, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+                    INSERT INTO {self.fts_table}(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+                END;
+            """)
+            if is_new:
+                # 기존 DB에 쌓여 있던 기록을 색인에 채워 넣습니다.
+                cursor.execute(f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('rebuild')")
+            self.fts_enabled = True
+
+        except sqlite3.Error as e:
+            # FTS5가 빠진 SQLite 빌드에서는 LIKE 검색으로 동작합니다.
+            print(f"⚠️ FTS5 색인 생성 실패 (LIKE 검색 사용): {e}")
+
+    def load_response_cache(self):
+        """
+        TTL이 지난 캐시를 정리하고, 남은 질문 임베딩을 모드별 행렬 색인으로 불러옵니다. (이미 불러왔으면 생략)
+        numpy 로드와 BLOB 변환이 창 표시를 늦추지 않도록 DB 초기화가 아닌 클라이언트 준비 후에 호출됩니다.
+        """
+        if self._cache_index is not None:
+            return
+        import numpy as np
+
+        try:
+            cutoff = (datetime.now() - timedelta(days=SEMANTIC_CACHE_TTL_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+            cursor = self.conn.cursor()
+            cursor.execute(f"DELETE FROM {self.cache_table} WHERE created_at < ?", (cutoff,))
+            cursor.execute(f"SELECT mode, embedding, answer, created_at FROM {self.cache_table} ORDER BY id")
+            self._cache_index = {}
+            for mode, blob, answer, created_at in cursor.fetchall():
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.shape[0] != EMBEDDING_DIM:
+                    continue # 차원이 다른 예전 임베딩은 건너뜁니다.
+                created_ts = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').timestamp()
+                self._cache_index.setdefault(mode, ResponseCacheIndex()).add(vector, answer, created_ts)
+        except Exception as e:
+            print(f"❌ 응답 캐시 로드 실패: {e}")
+
+    def find_similar_answer(self, embedding, mode=CHAT_CACHE_MODE):
+        """같은 모드의 캐시에서 정규화된 임베딩과 코사인 유사도가 기준 이상인 답변을 찾습니다. 없으면 None."""
+        if self._cache_index is None:
+            return None # 아직 색인을 불러오기 전에는 캐시 미적중으로 처리
+        index = self._cache_index.get(mode)
+        if index is None:
+            return None
+        min_created = time.time() - SEMANTIC_CACHE_TTL_DAYS * 86400
+        return index.find(embedding, SEMANTIC_CACHE_THRESHOLD, min_created)
+
+    def save_cached_response(self, question, answer, embedding, mode=CHAT_CACHE_MODE):
+        """질문 임베딩과 답변을 해당 모드의 시맨틱 캐시에 저장합니다."""
+        self.load_response_cache()
+        try:
+            now = datetime.now()
+            cursor = self.conn.cursor()
+            cursor.execute(self._sql_insert_cache, (mode, question, answer, embedding.tobytes(), now.strftime('%Y-%m-%d %H:%M:%S')))
+            self._cache_index.setdefault(mode, ResponseCacheIndex()).add(embedding, answer, now.timestamp())
+        except Exception as e:
+            print(f"❌ 응답 캐시 저장 실패: {e}")
+
+    def clear_cached_responses(self, mode):
+        """해당 모드의 시맨틱 캐시 항목을 DB와 메모리 색인에서 모두 지웁니다."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f"DELETE FROM {self.cache_table} WHERE mode = ?", (mode,))
+            if self._cache_index is not None:
+                self._cache_index.pop(mode, None) # 작업 스레드는 다음 조회부터 빈 색인을 봅니다.
+        except Exception as e:
+            print(f"❌ 응답 캐시 삭제 실패: {e}")
+
+    def get_recent_chat_turns(self, limit=HISTORY_SEED_TURNS):
+        """최근 일반 대화 기록을 오래된 순서의 (질문, 답변) 목록으로 반환합니다. ('[요약 요청]' 등 다른 모드 기록 제외)"""
+        self.flush_pending()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f"""
+                SELECT question, answer FROM {self.history_table}
+                WHERE question NOT LIKE '[%'
+                ORDER BY id DESC
+                LIMIT ?
+            """, (limit,))
+            return cursor.fetchall()[::-1]
+        except Exception as e:
+            print(f"❌ 최근 대화 로드 실패: {e}")
+            return []
 
     def get_contextual_facts(self):
-        """DB에서 사용자 팩트를 로드하여 Gemini 시스템 지침용 텍스트 생성."""
-        conn = None
+        """DB에서 사용자 팩트를 로드하여 Gemini 시스템 지침용 텍스트 생성. (팩트가 바뀌기 전까지 캐시 재사용)"""
+        if self._facts_prompt_cache is not None:
+            return self._facts_prompt_cache
         facts_list = []
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT fact_key, fact_value FROM {self.facts_table}")
+            cursor = self.conn.cursor()
+            cursor.execute(self._sql_select_facts)
             results = cursor.fetchall()
             
             if results:
@@ -84,144 +501,444 @@ class SQLiteChatDatabase:
             
             if facts_list:
                 facts_text = ", ".join(facts_list)
-                return f"당신은 이 사용자와 대화하고 있습니다. 이 사용자에 대한 다음 사실을 기억하고 대화에 활용해야 합니다: {facts_text}. 답변은 친절하고 유머러스한 톤으로 하세요."
+                self._facts_prompt_cache = f"당신은 이 사용자와 대화하고 있습니다. 이 사용자에 대한 다음 사실을 기억하고 대화에 활용해야 합니다: {facts_text}. 답변은 친절하고 유머러스한 톤으로 하세요."
             else:
-                return "당신은 일반적인 대화형 AI입니다."
+                self._facts_prompt_cache = "당신은 일반적인 대화형 AI입니다."
+            return self._facts_prompt_cache
             
         except Exception as e:
             print(f"❌ 팩트 로드 실패: {e}")
             return "당신은 일반적인 대화형 AI입니다."
-        finally:
-            if conn:
-                conn.close()
                 
     def save_chat_entry(self, question, answer):
-        """질문과 답변을 chat_history 테이블에 저장합니다."""
-        conn = None
-        try:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            sql = f"INSERT INTO {self.history_table} (question, answer, created_at) VALUES (?, ?, ?)"
-            cursor.execute(sql, (question, answer, current_time))
-            conn.commit()
-            print(f"✅ SQLite 저장 성공: {current_time}")
-        except Exception as e:
-            print(f"❌ SQLite 저장 실패: {e}")
-        finally:
-            if conn:
-                conn.close()
+        """
+        질문과 답변을 쓰기 대기열에 넣습니다. 실제 저장은 flush_pending()에서 한 번에 커밋됩니다.
+        대기열이 DB_FLUSH_BATCH_SIZE건에 이르면 바로 커밋하여 한 트랜잭션이 너무 커지지 않게 합니다.
+        """
+        if not question or not answer:
+            return # 빈 기록은 저장하지 않습니다. (CHECK 제약에 걸려 배치 전체가 롤백되지 않도록)
+        self._write_queue.append((question, answer))
+        if len(self._write_queue) >= DB_FLUSH_BATCH_SIZE:
+            self.flush_pending()
+
+    def flush_pending(self):
+        """대기열의 기록을 하나의 트랜잭션(executemany)으로 chat_history 테이블에 저장합니다."""
+        with self._write_lock:
+            if not self._write_queue or self._closed:
+                return # 창을 닫은 뒤 도착한 답변은 저장할 연결이 없음
+            rows = self._write_queue
+            self._write_queue = []
+            cursor = self.conn.cursor()
+            try:
+                # 저장 시각은 SQLite가 직접 기록합니다. (기존 DB 스키마에도 그대로 동작)
+                # IMMEDIATE: 쓰기 잠금을 처음부터 잡아, 다른 연결과 겹칠 때 도중에 잠금 승격이 실패하지 않게 합니다.
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.executemany(self._sql_insert_history, rows)
+                cursor.execute("COMMIT")
+                print(f"✅ SQLite 저장 성공: {len(rows)}건")
+            except Exception as e:
+                if self.conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                print(f"❌ SQLite 저장 실패: {e}")
                 
     def delete_last_entry(self):
         """가장 최근에 저장된 레코드를 삭제합니다."""
-        conn = None
+        self.flush_pending()
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            cursor = self.conn.cursor()
             
-            cursor.execute(f"SELECT id FROM {self.history_table} ORDER BY id DESC LIMIT 1")
-            last_id_row = cursor.fetchone()
-            
-            if last_id_row:
-                record_id = last_id_row[0]
-                cursor.execute(f"DELETE FROM {self.history_table} WHERE id = ?", (record_id,))
-                conn.commit()
-                return record_id
+            with self._write_lock: # 마지막 id 조회와 삭제 사이에 다른 저장이 끼어들지 않도록
+                cursor.execute(self._sql_select_last_id)
+                last_id_row = cursor.fetchone()
+                
+                if last_id_row:
+                    record_id = last_id_row[0]
+                    cursor.execute(self._sql_delete_history, (record_id,))
+                    return record_id
             return None
         except Exception as e:
             print(f"❌ SQLite 삭제 실패: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
 
     def get_user_facts_map(self):
-        """DB에서 사용자 팩트를 {key: value} 딕셔너리 형태로 로드"""
-        conn = None
+        """DB에서 사용자 팩트를 {key: value} 딕셔너리 형태로 로드 (팩트가 바뀌기 전까지 캐시 재사용)"""
+        if self._facts_map_cache is not None:
+            return dict(self._facts_map_cache)
         facts_map = {}
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT fact_key, fact_value FROM {self.facts_table}")
+            cursor = self.conn.cursor()
+            cursor.execute(self._sql_select_facts)
             results = cursor.fetchall()
             for row in results:
                 facts_map[row[0]] = row[1]
-            return facts_map
+            self._facts_map_cache = facts_map
+            return dict(facts_map)
         except Exception as e:
             print(f"❌ 팩트 맵 로드 실패: {e}")
             return {}
-        finally:
-            if conn:
-                conn.close()
 
     def add_or_update_fact(self, key, value):
         """팩트를 추가하거나 업데이트합니다. (SQLite는 INSERT OR REPLACE 사용)"""
-        conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            sql = f"INSERT OR REPLACE INTO {self.facts_table} (fact_key, fact_value) VALUES (?, ?)"
-            cursor.execute(sql, (key, value))
-            conn.commit()
+            cursor = self.conn.cursor()
+            cursor.execute(self._sql_upsert_fact, (key, value))
+            self._invalidate_facts_cache()
             return True
         except Exception as e:
             print(f"❌ 팩트 업데이트 실패: {e}")
             return False
-        finally:
-            if conn:
-                conn.close()
 
     def delete_fact(self, key):
         """팩트를 삭제합니다."""
-        conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"DELETE FROM {self.facts_table} WHERE fact_key = ?", (key,))
-            changes = cursor.rowcount
-            conn.commit()
-            return changes > 0
+            cursor = self.conn.cursor()
+            cursor.execute(self._sql_delete_fact, (key,))
+            if cursor.rowcount > 0:
+                self._invalidate_facts_cache()
+                return True
+            return False
         except Exception as e:
             print(f"❌ 팩트 삭제 실패: {e}")
             return False
-        finally:
-            if conn:
-                conn.close()
+
+    def _invalidate_facts_cache(self):
+        """
+        팩트가 바뀌었으므로 캐시된 시스템 지침 문자열과 팩트 맵을 버립니다.
+        대화 모드의 캐시된 답변도 이전 팩트를 바탕으로 만들어졌으므로 함께 지웁니다. (다른 모드는 팩트를 쓰지 않음)
+        """
+        self._facts_prompt_cache = None
+        self._facts_map_cache = None
+        self.clear_cached_responses(CHAT_CACHE_MODE)
 
     def search_history_by_keyword(self, keyword):
-        """DB 기록을 키워드로 검색합니다."""
-        conn = None
+        """
+        DB 기록을 키워드로 검색합니다. (FTS5 사용 가능 시 BM25 관련도 순)
+        질문은 100자, 답변은 200자까지 SQLite에서 잘라 '...'을 붙인 미리보기로 반환합니다.
+        """
+        self.flush_pending()
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            search_like = f"%{keyword}%"
-            sql = f"""
-            SELECT created_at, question, answer
-            FROM {self.history_table}
-            WHERE question LIKE ? OR answer LIKE ?
-            ORDER BY created_at DESC
-            LIMIT 50
-            """
-            cursor.execute(sql, (search_like, search_like))
-            results = cursor.fetchall()
-            cols = [desc[0] for desc in cursor.description]
-            return [dict(zip(cols, row)) for row in results]
+            cursor = self.conn.cursor()
+            results = []
+            if self.fts_enabled:
+                # 사용자 입력을 하나의 구(phrase)로 인용하고, 접두어 검색(*)으로 조사가 붙은 단어도 찾습니다.
+                match_query = '"' + keyword.replace('"', '""') + '"*'
+                cursor.execute(self._sql_search_fts, (match_query,))
+                results = cursor.fetchall()
+            if not results:
+                # FTS5를 쓸 수 없거나, 단어 중간에 걸친 키워드(예: '질문'의 '문')라 색인에서 찾지 못한 경우
+                results = self._search_history_like(cursor, keyword)
+            return results
 
         except Exception as e:
             print(f"❌ DB 키워드 검색 실패: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
+
+    def _search_history_like(self, cursor, keyword):
+        """
+        LIKE '%키워드%' 부분 문자열 검색으로 최신순 결과를 반환합니다.
+        두 컬럼을 OR로 묶지 않고 컬럼별 SELECT를 UNION하여 각 분기가 따로 계획되도록 합니다.
+        """
+        search_like = f"%{keyword}%"
+        cursor.execute(self._sql_search_like, (search_like, search_like))
+        return cursor.fetchall()
 
 # ----------------------------------------------------------------------
-# 3. 메인 애플리케이션 모듈 (GeminiChatApp Class)
+# 3. 백그라운드 작업 모듈 (GeminiWorker Class)
 # ----------------------------------------------------------------------
-class GeminiChatApp(QDialog):
+def embed_text(client, text):
+    """텍스트 임베딩을 계산하여 L2 정규화된 float32 numpy 벡터로 반환합니다. (내적 = 코사인 유사도)"""
+    import numpy as np
+    from google.genai import types
+
+    result = client.models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=text,
+        config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIM)
+    )
+    vector = np.asarray(result.embeddings[0].values, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def chat_cache_text(chat, question):
+    """
+    대화 모드 시맨틱 캐시의 임베딩 대상: 세션의 직전 사용자 질문을 앞에 붙입니다.
+    '그게 뭐야?', '더 자세히' 같은 짧은 후속 질문이 맥락이 다른 과거 답변과 맞지 않게 합니다. (작업 스레드에서 호출)
+    """
+    for content in reversed(chat.get_history(curated=True)):
+        if content.role != "user":
+            continue
+        previous = "".join(part.text or "" for part in content.parts or [])
+        if previous.startswith(SYSTEM_PROMPT_PREFIX):
+            break # 팩트 전달용 첫 턴은 맥락에서 제외 (모든 첫 질문이 비슷하게 임베딩되지 않도록)
+        return f"{previous}\n{question}"
+    return question
+
+
+def load_image_part(image_path, mime_type):
+    """이미지 파일을 mmap으로 읽어 Gemini Part로 만듭니다. (작업 스레드에서 호출)"""
+    from google.genai import types
+
+    with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # SDK가 base64로 인코딩하므로 bytes 한 벌은 필요하지만, read()처럼 버퍼를 키워 가며 읽지는 않습니다.
+        return types.Part.from_bytes(data=bytes(mm), mime_type=mime_type)
+
+
+@lru_cache(maxsize=None)
+def get_request_config(system_instruction=None, web_search=False):
+    """
+    단발 요청용 GenerateContentConfig를 설정 조합마다 한 번만 만들어 재사용합니다.
+    요청마다 pydantic 검증을 다시 거치지 않으며, 호출 측에서 수정하지 않으므로 작업 스레드끼리 공유해도 안전합니다.
+    """
+    from google.genai import types
+
+    tools = [{"googleSearch": {}}] if web_search else None
+    return types.GenerateContentConfig(system_instruction=system_instruction, tools=tools)
+
+
+class WorkerSignals(QObject):
+    """작업 스레드에서 GUI 스레드로 결과를 전달하는 시그널 모음입니다."""
+    chunk = pyqtSignal(str)                  # 스트리밍 중 도착한 답변 조각
+    finished = pyqtSignal(str, str, object)  # (질문, 답변, 질문 임베딩 또는 None)
+    cached = pyqtSignal(str, str)            # (질문, 캐시된 답변)
+    error = pyqtSignal(str, str)             # (질문, 예외 클래스명)
+
+
+class GeminiWorker(QRunnable):
+    """
+    chat.send_message_stream 호출을 QThreadPool 스레드에서 실행하여 네트워크 대기 중에도 UI가 멈추지 않게 합니다.
+    답변 조각은 도착하는 즉시 chunk 시그널로 전달됩니다.
+    cache가 주어지면 API 호출 전에 (직전 질문까지 포함해) 비슷한 과거 질문의 답변을 먼저 찾고,
+    찾은 답변은 세션 기록에도 넣어 다음 질문의 맥락이 끊기지 않게 합니다.
+    """
+    def __init__(self, client, chat, question, cache=None):
+        super().__init__()
+        self.client = client
+        self.chat = chat
+        self.question = question
+        self.cache = cache
+        self.signals = WorkerSignals()
+
+    @pyqtSlot()
+    def run(self):
+        embedding = None
+        if self.cache is not None:
+            try:
+                embedding = embed_text(self.client, chat_cache_text(self.chat, self.question))
+                cached_answer = self.cache.find_similar_answer(embedding)
+                if cached_answer is not None:
+                    self._record_cached_turn(cached_answer)
+                    self.signals.cached.emit(self.question, cached_answer)
+                    return
+            except Exception as e:
+                print(f"⚠️ 시맨틱 캐시 조회 실패 (API 직접 호출): {e}")
+                embedding = None
+
+        try:
+            answer_parts = []
+            for chunk in self.chat.send_message_stream(self.question):
+                if chunk.text:
+                    answer_parts.append(chunk.text)
+                    self.signals.chunk.emit(chunk.text)
+            self.signals.finished.emit(self.question, "".join(answer_parts).strip(), embedding)
+        except Exception as e:
+            print(f"API Error: {e}")
+            self.signals.error.emit(self.question, type(e).__name__)
+
+    def _record_cached_turn(self, cached_answer):
+        """API를 거치지 않은 (질문, 캐시된 답변)을 채팅 세션 기록에 추가합니다."""
+        from google.genai import types
+
+        self.chat.record_history(
+            user_input=types.Content(role="user", parts=[types.Part(text=self.question)]),
+            model_output=[types.Content(role="model", parts=[types.Part(text=cached_answer)])],
+            automatic_function_calling_history=[],
+            is_valid=True,
+        )
+
+
+class RequestSignals(QObject):
+    """단발 요청(generate_content_stream)의 결과를 GUI 스레드로 전달하는 시그널 모음입니다."""
+    chunk = pyqtSignal(object, str)             # (요청 정보, 스트리밍 중 도착한 답변 조각)
+    finished = pyqtSignal(object, str, object)  # (요청 정보, 답변, 질문 임베딩 또는 None)
+    cached = pyqtSignal(object, str)            # (요청 정보, 캐시된 답변)
+    error = pyqtSignal(object, str)             # (요청 정보, 예외 클래스명)
+
+
+class GeminiRequest(QRunnable):
+    """
+    client.models.generate_content_stream 한 번의 호출을 QThreadPool 스레드에서 실행합니다. 답변 조각은 chunk 시그널로 바로 전달됩니다.
+    채팅 세션을 쓰지 않는 모드(요약, 코딩, 웹 검색 등)가 사용하며, info는 결과와 함께 그대로 돌려줍니다.
+    cache가 주어지면 info['cache_text']의 임베딩으로 info['cache_mode'] 캐시를 먼저 찾습니다.
+    contents가 함수이면 작업 스레드에서 호출해 요청 내용을 만듭니다. (예: 이미지 파일 읽기)
+    """
+    def __init__(self, client, model, contents, config=None, info=None, cache=None):
+        super().__init__()
+        self.client = client
+        self.model = model
+        self.contents = contents
+        self.config = config
+        self.info = info
+        self.cache = cache
+        self.signals = RequestSignals()
+
+    @pyqtSlot()
+    def run(self):
+        embedding = None
+        if self.cache is not None:
+            try:
+                embedding = embed_text(self.client, self.info['cache_text'])
+                cached_answer = self.cache.find_similar_answer(embedding, self.info['cache_mode'])
+                if cached_answer is not None:
+                    self.signals.cached.emit(self.info, cached_answer)
+                    return
+            except Exception as e:
+                print(f"⚠️ 시맨틱 캐시 조회 실패 (API 직접 호출): {e}")
+                embedding = None
+
+        try:
+            contents = self.contents() if callable(self.contents) else self.contents
+            answer_parts = []
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=self.config
+            ):
+                if chunk.text:
+                    answer_parts.append(chunk.text)
+                    self.signals.chunk.emit(self.info, chunk.text)
+            self.signals.finished.emit(self.info, "".join(answer_parts).strip(), embedding)
+        except Exception as e:
+            print(f"API Error: {e}")
+            self.signals.error.emit(self.info, type(e).__name__)
+
+
+class InitSignals(QObject):
+    """클라이언트 초기화 결과를 GUI 스레드로 전달하는 시그널 모음입니다."""
+    ready = pyqtSignal(int, object, object, object)  # (초기화 세대, client, chat, 컨텍스트 캐시 이름 또는 None)
+    failed = pyqtSignal(int, str)                    # (초기화 세대, 예외 클래스명)
+
+
+class GeminiInitWorker(QRunnable):
+    """
+    genai 모듈 로드, Client 생성, 채팅 세션(및 컨텍스트 캐시) 생성을 QThreadPool 스레드에서 수행합니다.
+    창은 먼저 그려지고, 준비가 끝나면 ready 시그널로 client와 chat이 전달됩니다.
+    client가 주어지면(세션 재설정) Client는 다시 만들지 않고 채팅 세션만 새로 만듭니다.
+    generation은 결과와 함께 돌려주어, 그 사이 더 새로운 초기화가 시작됐으면 GUI 쪽에서 이 결과를 버릴 수 있게 합니다.
+    """
+    def __init__(self, generation, api_key, model, user_facts, recent_turns, old_cache_name=None, client=None):
+        super().__init__()
+        self.generation = generation
+        self.api_key = api_key
+        self.client = client
+        self.model = model
+        self.user_facts = user_facts
+        self.recent_turns = recent_turns
+        self.old_cache_name = old_cache_name
+        self.signals = InitSignals()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            # google.genai는 의존성(httpx, pydantic 등)이 커서 모듈 로드 시가 아닌 여기서 불러옵니다.
+            from google import genai
+            from google.genai import types
+            import numpy # 응답 캐시 색인(_on_client_ready에서 로드)에 쓰이므로 GUI 스레드 대신 여기서 미리 불러 둡니다.
+
+            client = self.client or genai.Client(api_key=self.api_key)
+
+            initial_history = [
+                types.Content(role="user", parts=[types.Part(text=SYSTEM_PROMPT_PREFIX + self.user_facts)]),
+                types.Content(role="model", parts=[types.Part(text="시스템 지침을 확인했습니다. 이제부터 당신의 팩트와 컨텍스트를 기억하며 대화하겠습니다.")])
+            ]
+            # 최근 대화를 시작 컨텍스트로 넣어, 매 요청의 앞부분(prefix)이 같아지도록 합니다. (암시적 캐시 적중)
+            for question, answer in self.recent_turns:
+                initial_history.append(types.Content(role="user", parts=[types.Part(text=question)]))
+                initial_history.append(types.Content(role="model", parts=[types.Part(text=answer)]))
+
+            chat, cache_name = self._create_cached_chat(client, initial_history)
+            if chat is None:
+                chat = client.chats.create(model=self.model, history=initial_history)
+            self.signals.ready.emit(self.generation, client, chat, cache_name)
+
+        except Exception as e:
+            print(f"Error during initialization: {e}")
+            self.signals.failed.emit(self.generation, e.__class__.__name__)
+
+    def _create_cached_chat(self, client, history):
+        """
+        시작 컨텍스트가 충분히 길면 명시적 캐시로 등록하고 (그 캐시를 쓰는 채팅 세션, 캐시 이름)을 반환합니다.
+        짧거나 캐시 생성에 실패하면 (None, None)을 반환합니다.
+        """
+        from google.genai import types
+
+        # 대략적인 토큰 수 추정 (문자 4개 ≈ 1토큰)
+        estimated_tokens = sum(len(part.text) for content in history for part in content.parts) // 4
+        if estimated_tokens < EXPLICIT_CACHE_MIN_TOKENS:
+            return None, None
+
+        if self.old_cache_name:
+            try:
+                client.caches.delete(name=self.old_cache_name)
+            except Exception as e:
+                print(f"⚠️ 이전 컨텍스트 캐시 삭제 실패 (이미 만료되었을 수 있음): {e}")
+
+        try:
+            cache = client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(contents=history, ttl=CONTEXT_CACHE_TTL)
+            )
+            chat = client.chats.create(
+                model=self.model,
+                config=types.GenerateContentConfig(cached_content=cache.name)
+            )
+            return chat, cache.name
+        except Exception as e:
+            print(f"⚠️ 컨텍스트 캐시 생성 실패 (일반 세션 사용): {e}")
+            return None, None
+
+
+class CacheRefreshSignals(QObject):
+    """컨텍스트 캐시 연장 결과를 GUI 스레드로 전달하는 시그널 모음입니다."""
+    failed = pyqtSignal(str) # 연장하지 못한 캐시 이름
+
+
+class ContextCacheRefresher(QRunnable):
+    """
+    명시적 컨텍스트 캐시의 TTL을 QThreadPool 스레드에서 연장합니다. (네트워크 대기 중에도 UI가 멈추지 않음)
+    delete=True이면 연장 대신 캐시를 삭제합니다. (버려진 초기화 결과의 캐시 정리용)
+    """
+    def __init__(self, client, cache_name, delete=False):
+        super().__init__()
+        self.client = client
+        self.cache_name = cache_name
+        self.delete = delete
+        self.signals = CacheRefreshSignals()
+
+    @pyqtSlot()
+    def run(self):
+        from google.genai import types
+
+        if self.delete:
+            try:
+                self.client.caches.delete(name=self.cache_name)
+            except Exception as e:
+                print(f"⚠️ 컨텍스트 캐시 삭제 실패: {e}")
+            return
+        try:
+            self.client.caches.update(name=self.cache_name, config=types.UpdateCachedContentConfig(ttl=CONTEXT_CACHE_TTL))
+        except Exception as e:
+            print(f"⚠️ 컨텍스트 캐시 연장 실패: {e}")
+            self.signals.failed.emit(self.cache_name)
+
+# ----------------------------------------------------------------------
+# 4. 메인 애플리케이션 모듈 (GeminiChatApp Class)
+# ----------------------------------------------------------------------
+class GeminiChatApp(QDialog, Ui_Dialog):
     def __init__(self):
         super().__init__()
         
-        # 3.1. 초기화 및 설정
+        # 4.1. 초기화 및 설정
         try:
             self.db_handler = SQLiteChatDatabase()
         except ConnectionError as e:
@@ -230,17 +947,24 @@ class GeminiChatApp(QDialog):
             
         self.user_facts = self.db_handler.get_contextual_facts()
         
-        # 🚨 로컬 실행 환경에서는 UI 파일을 로드해야 합니다.
-        try:
-            loadUi("gemini.ui", self)
-        except FileNotFoundError:
-            # Mock UI 구성
-            pass
+        # 🚨 컴파일된 UI 클래스(ui_gemini.py)가 있으면 XML 파싱 없이 바로 위젯을 생성합니다.
+        if hasattr(self, 'setupUi'):
+            self.setupUi(self)
+        else:
+            try:
+                from PyQt5.uic import loadUi
+                loadUi("gemini.ui", self)
+            except FileNotFoundError:
+                # Mock UI 구성
+                pass
         
         # Mock UI 구성 (로컬에선 무시됨.)
         if not hasattr(self, 'lineEdit'):
-            self.lineEdit = type('MockLineEdit', (object,), {'text': lambda self: '', 'clear': lambda self: None})()
-            self.txtBrowserResult = type('MockTextBrowser', (object,), {'append': print, 'toPlainText': lambda self: "Mock Text", 'setText': print, 'ensureCursorVisible': lambda self: None})()
+            self.lineEdit = type('MockLineEdit', (object,), {'text': lambda self: '', 'clear': lambda self: None, 'blockSignals': lambda self, block: False})()
+            # 로그 출력은 QTextCursor로 문서에 직접 넣으므로, Mock도 실제 QTextDocument와 스크롤바 흉내를 갖춰야 합니다.
+            mock_document = QTextDocument(self)
+            mock_scroll_bar = type('MockScrollBar', (object,), {'value': lambda self: 0, 'maximum': lambda self: 0, 'setValue': lambda self, value: None})()
+            self.txtBrowserResult = type('MockTextBrowser', (object,), {'append': print, 'toPlainText': lambda self: mock_document.toPlainText(), 'setText': lambda self, text: mock_document.setPlainText(text), 'document': lambda self: mock_document, 'verticalScrollBar': lambda self: mock_scroll_bar, 'ensureCursorVisible': lambda self: None})()
             self.pushButton = type('MockButton', (object,), {'clicked': type('MockSignal', (object,), {'connect': lambda self, func: None})()})()
             
             # Mock for pushButton_2 (업로드 버튼) 및 lineEdit_file (파일 경로)
@@ -252,33 +976,96 @@ class GeminiChatApp(QDialog):
             
             self.comboBox = type('MockComboBox', (object,), {'currentText': lambda self: '대화', 'addItem': lambda self, item: None, 'currentIndexChanged': type('MockSignal', (object,), {'connect': lambda self, func: None})()})()
             self.myPic = type('MockLabel', (object,), {'width': lambda self: 100})()
+            self.checkBox_cache = type('MockCheckBox', (object,), {'isChecked': lambda self: True})()
 
         # ⭐️ UI 파일이 로드된 경우, '파일명' 라벨은 self.label_4 임을 확인했습니다. ⭐️
         # 추가적인 라벨 연결 로직 없이, 코드에서 self.label_4를 직접 사용합니다.
 
+        self.apply_circular_mask()
 
         self.chat = None
         self.client = None
         self.model = 'gemini-2.5-flash'
+        self._context_cache_name = None # 명시적 컨텍스트 캐시 이름 (caches.create 결과)
+        self._init_generation = 0 # init_gemini_client 호출마다 증가 (가장 최근 초기화 결과만 적용)
+        self._client_connecting = False # 작업 스레드에서 클라이언트를 준비 중인지 여부
+        self._session_announced = False # 첫 연결 안내를 표시했는지 여부 (이후 연결은 '재설정 완료'로 안내)
+        self._pending_questions = [] # 연결 중이거나 이전 답변 생성 중에 입력된 질문 대기열
         self.image_path = "" # 이미지 파일 경로를 저장할 변수 추가
+        self._last_file_mode = None # 마지막으로 적용한 파일 위젯 가시성 (같으면 setVisible 생략)
+        self._chat_busy = False # 대화 모드 요청이 작업 스레드에서 처리 중인지 여부
+        # 현재 대화 답변의 스트림 상태: anchor('생성하는 중...' 줄의 QTextCursor), generation(anchor를 만든 시점의 로그 세대),
+        # parts(그리기 전 조각), started(첫 조각 출력 여부), length(anchor부터 지금까지 출력한 길이)
+        self._chat_stream = None
+        # API 호출 전용 스레드 풀: 전역 풀은 CPU 코어 수만큼만 돌아 1코어에서는 긴 답변 하나가 다른 요청을 모두 막습니다.
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(API_THREAD_COUNT)
+
+        # 로그 출력 버퍼: 여러 번의 출력을 모았다가 33ms(약 30fps)마다 한 번에 그립니다.
+        self._pending_text = []
+        self._log_generation = 0 # 결과창을 통째로 바꿀 때(_set_log)마다 1씩 증가: 그 전에 만든 anchor는 자리를 잃은 것으로 봅니다.
+        self._active_streams = {} # 그릴 조각이 쌓인 스트림 {id(stream): stream}
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(33)
+        self._flush_timer.timeout.connect(self._flush_text)
+
+        # DB 쓰기 배치: 저장 요청을 200ms 동안 모아 한 트랜잭션으로 커밋합니다.
+        self._db_flush_timer = QTimer(self)
+        self._db_flush_timer.setSingleShot(True)
+        self._db_flush_timer.setInterval(200)
+        self._db_flush_timer.timeout.connect(self.db_handler.flush_pending)
+
+        # 오래 켜 둔 세션에서도 쿼리 플래너 통계가 낡지 않도록 주기적으로 PRAGMA optimize 실행
+        self._db_optimize_timer = QTimer(self)
+        self._db_optimize_timer.setInterval(DB_OPTIMIZE_INTERVAL_MS)
+        self._db_optimize_timer.timeout.connect(lambda: self.db_handler.optimize(0x10012))
+        self._db_optimize_timer.start()
+        # 명시적 컨텍스트 캐시가 세션 도중 만료되지 않도록 주기적으로 TTL을 연장 (캐시를 쓰는 세션에서만 동작)
+        self._context_cache_timer = QTimer(self)
+        self._context_cache_timer.setInterval(CONTEXT_CACHE_REFRESH_MS)
+        self._context_cache_timer.timeout.connect(self._refresh_context_cache)
+
+        # 검색 모드 입력 디바운스 및 결과 메모: {검색어: (결과, 저장 시각)}
+        self._search_cache = {}
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self._search_timer.timeout.connect(self._run_search)
+
+        # 팩트 수정 후 세션 재설정 디바운스: 여러 팩트를 연달아 고쳐도 마지막 수정 후 한 번만 재설정합니다.
+        self._facts_dirty = False
+        self._facts_reset_timer = QTimer(self)
+        self._facts_reset_timer.setSingleShot(True)
+        self._facts_reset_timer.setInterval(FACTS_RESET_DELAY_MS)
+        self._facts_reset_timer.timeout.connect(self._flush_fact_changes)
+
+        # 완전히 같은 (모드, 입력)의 답변 LRU 캐시: {blake2b 16바이트 키: 답변} (임베딩 API 호출도 생략)
+        self._prompt_cache = OrderedDict()
         self.init_gemini_client()
         
-        # 3.2. UI 모드 항목 추가 (기능 활성화)
-        self.comboBox.addItem("대화")
-        self.comboBox.addItem("검색")
-        self.comboBox.addItem("요약")
-        self.comboBox.addItem("코딩")
-        self.comboBox.addItem("웹 검색")
-        self.comboBox.addItem("기억 관리")
-        self.comboBox.addItem("데이터 분석")
-        self.comboBox.addItem("이미지 분석")
-        self.comboBox.addItem("에이전트 워크플로우")
+        # 4.2. UI 모드 항목 추가 (기능 활성화) - 모드 이름으로 바로 핸들러를 찾는 분기 테이블
+        self._mode_handlers = {
+            "대화": self.send_question,
+            "검색": self.search_history,
+            "요약": partial(self._run_llm_task, "요약"),
+            "코딩": partial(self._run_llm_task, "코딩"),
+            "웹 검색": partial(self._run_llm_task, "웹 검색"),
+            "기억 관리": self.handle_fact_management,
+            "데이터 분석": partial(self._run_llm_task, "데이터 분석"),
+            "이미지 분석": self.handle_image_analysis,
+            "에이전트 워크플로우": partial(self._run_llm_task, "에이전트 워크플로우"),
+        }
+        for mode in self._mode_handlers:
+            self.comboBox.addItem(mode)
         
-        # 3.3. 시그널 연결 (실제 PyQt5 객체에 연결되어야 함)
+        # 4.3. 시그널 연결 (실제 PyQt5 객체에 연결되어야 함)
         if hasattr(self, 'pushButton') and hasattr(self.pushButton, 'clicked'):
             self.pushButton.clicked.connect(self.handle_action)
         if hasattr(self, 'lineEdit') and hasattr(self.lineEdit, 'returnPressed'):
             self.lineEdit.returnPressed.connect(self.handle_action)
+        # '검색' 모드에서는 입력하는 동안 디바운스된 실시간 검색을 수행
+        if hasattr(self, 'lineEdit') and hasattr(self.lineEdit, 'textChanged'):
+            self.lineEdit.textChanged.connect(self._schedule_search)
         
         # '업로드' 버튼 (pushButton_2) 시그널 연결
         if hasattr(self, 'pushButton_2') and hasattr(self.pushButton_2, 'clicked'):
@@ -291,46 +1078,132 @@ class GeminiChatApp(QDialog):
         # ⭐️ UI 가시성 초기 설정 및 파일 경로 초기화 ⭐️
         self.update_ui_visibility(initial_call=True) 
         
-        if self.client:
-            self.txtBrowserResult.setText(f"Gemini AI에게 질문을 입력하세요.\n\n[Gemini]: 로컬 **SQLite DB**에 모든 기록을 저장하여 응답성이 향상되었습니다. 기능별 모드를 선택하세요.")
+        if self._client_connecting:
+            self._set_log("🔌 Gemini AI에 연결하는 중...")
 
+    def apply_circular_mask(self):
+        """
+        프로필 사진(myPic)을 원형으로 잘라 표시합니다.
+        CSS border-radius와 달리 스타일 엔진을 거치지 않고, 한 번 계산한 비트맵 마스크로만 클리핑합니다.
+        """
+        if not hasattr(self.myPic, 'setMask'):
+            return
+        side = min(self.myPic.width(), self.myPic.height()) or 100
+        x = (self.myPic.width() - side) // 2
+        y = (self.myPic.height() - side) // 2
+        self.myPic.setMask(QRegion(x, y, side, side, QRegion.Ellipse))
+
+    def done(self, result):
+        """Esc(reject)와 창 닫기 버튼 모두 이곳을 거쳐 창이 숨겨지므로, 여기서 종료 정리를 합니다."""
+        self._shutdown()
+        super().done(result)
+
+    def closeEvent(self, event):
+        """숨겨진 상태에서 close()된 경우처럼 done()을 거치지 않는 종료에도 정리를 합니다."""
+        self._shutdown()
+        super().closeEvent(event)
+
+    def _shutdown(self):
+        """컨텍스트 캐시를 삭제하고(종료 후 과금 방지) 유지 중인 DB 연결을 정리합니다. (여러 번 호출되어도 한 번만 수행)"""
+        self._context_cache_timer.stop()
+        if self.client and self._context_cache_name:
+            try:
+                self.client.caches.delete(name=self._context_cache_name)
+            except Exception as e:
+                print(f"⚠️ 컨텍스트 캐시 삭제 실패: {e}")
+            self._context_cache_name = None
+        self.db_handler.close() # 이미 닫혔으면 아무것도 하지 않음
 
     # ----------------------------------------------------------------------
-    # 4. Gemini API 핸들러 (Gemini Client & Session)
+    # 5. Gemini API 핸들러 (Gemini Client & Session)
     # ----------------------------------------------------------------------
     def init_gemini_client(self):
-        if not API_KEY:
+        """API 키를 확인한 뒤, 클라이언트와 채팅 세션 생성은 작업 스레드(GeminiInitWorker)에 맡깁니다."""
+        api_key = get_api_key()
+        if not api_key:
             QMessageBox.warning(self, "API 오류", "🚨 경고: 'GEMINI_API_KEY' 환경 변수가 설정되지 않았습니다.")
             return
-            
-        try:
-            self.client = genai.Client(api_key=API_KEY)
-            
-            initial_history = [
-                types.Content(role="user", parts=[types.Part(text="이 대화의 시스템 지침은 다음과 같습니다: " + self.user_facts)]),
-                types.Content(role="model", parts=[types.Part(text="시스템 지침을 확인했습니다. 이제부터 당신의 팩트와 컨텍스트를 기억하며 대화하겠습니다.")])
-            ]
-            self.chat = self.client.chats.create(
-                model=self.model,
-                history=initial_history
-            )
 
-        except Exception as e:
-            error_msg = f"Gemini 클라이언트 초기화 중 오류 발생: {e.__class__.__name__}."
-            QMessageBox.critical(self, "초기화 오류", error_msg)
-            print(f"Error during initialization: {e}")
-            self.client = None
-            self.chat = None
-            
+        # 이전 초기화가 아직 끝나지 않았어도 새 세대를 시작하고, 늦게 도착한 이전 결과는 _on_client_ready에서 버립니다.
+        self._init_generation += 1
+        worker = GeminiInitWorker(
+            self._init_generation, api_key, self.model, self.user_facts,
+            self.db_handler.get_recent_chat_turns(), self._context_cache_name, self.client
+        )
+        worker.signals.ready.connect(self._on_client_ready)
+        worker.signals.failed.connect(self._on_client_failed)
+        self.chat = None
+        self._client_connecting = True
+        self._thread_pool.start(worker)
+
+    def _on_client_ready(self, generation, client, chat, cache_name):
+        """작업 스레드에서 준비된 client/chat을 적용하고, 연결을 기다리던 질문을 보냅니다."""
+        if generation != self._init_generation:
+            # 더 새로운 초기화(예: 이후의 팩트 수정)가 진행 중이므로 이 세션은 버리고 캐시만 정리합니다.
+            if cache_name:
+                self._thread_pool.start(ContextCacheRefresher(client, cache_name, delete=True))
+            return
+        self.client = client
+        self.chat = chat
+        self._context_cache_name = cache_name
+        self._client_connecting = False
+        if cache_name:
+            self._context_cache_timer.start()
+        else:
+            self._context_cache_timer.stop()
+        self.db_handler.load_response_cache()
+
+        if self._session_announced:
+            self._append_log("\n\n[System]: 🔄 **대화 세션 재설정 완료.**\n새로운 사용자 팩트(기억)가 Gemini AI에 적용되었습니다.")
+        elif self._pending_questions:
+            self._append_log("\n\n[System]: ✅ Gemini 연결 완료. 대기 중인 질문을 보냅니다.")
+        else:
+            self._set_log(f"Gemini AI에게 질문을 입력하세요.\n\n[Gemini]: 로컬 **SQLite DB**에 모든 기록을 저장하여 응답성이 향상되었습니다. 기능별 모드를 선택하세요.")
+        self._session_announced = True
+        self._send_next_pending_question()
+
+    def _refresh_context_cache(self):
+        """현재 세션의 컨텍스트 캐시 TTL 연장을 작업 스레드에 맡깁니다."""
+        if not self.client or not self._context_cache_name:
+            return
+        refresher = ContextCacheRefresher(self.client, self._context_cache_name)
+        refresher.signals.failed.connect(self._on_context_cache_lost)
+        self._thread_pool.start(refresher)
+
+    def _on_context_cache_lost(self, cache_name):
+        """캐시를 연장하지 못했으면(이미 만료·삭제됨) 그 캐시에 묶인 세션이 실패하기 전에 세션을 새로 만듭니다."""
+        if self._client_connecting or cache_name != self._context_cache_name:
+            return # 이미 새 세션을 준비 중이거나 다른 캐시로 바뀌었음
+        self._context_cache_timer.stop()
+        self._append_log("\n\n[System]: ⚠️ 대화 컨텍스트 캐시가 만료되어 세션을 다시 연결합니다.")
+        self.init_gemini_client()
+
+    def _on_client_failed(self, generation, error_name):
+        """클라이언트 초기화 실패를 알리고, 대기 중이던 질문을 정리합니다."""
+        if generation != self._init_generation:
+            return # 이미 더 새로운 초기화가 진행 중
+        self._client_connecting = False
+        self.client = None
+        self.chat = None
+        error_msg = f"Gemini 클라이언트 초기화 중 오류 발생: {error_name}."
+        QMessageBox.critical(self, "초기화 오류", error_msg)
+        if self._pending_questions:
+            self._append_log(f"\n\n[Error]: 연결 실패로 대기 중이던 질문 {len(self._pending_questions)}개를 보내지 못했습니다.")
+            self._pending_questions.clear()
+
     # ----------------------------------------------------------------------
-    # 5. 통합 액션 및 핵심 기능 핸들러
+    # 6. 통합 액션 및 핵심 기능 핸들러
     # ----------------------------------------------------------------------
     def update_ui_visibility(self, index=None, initial_call=False):
         """⭐️ 콤보박스 선택에 따라 파일명 라벨(label_4), 파일 경로 입력창, 업로드 버튼의 가시성을 제어합니다. ⭐️"""
         selected_mode = self.comboBox.currentText()
         
         # '데이터 분석' 또는 '이미지 분석' 모드에서만 보이도록 설정
-        is_file_mode = selected_mode.startswith("데이터 분석") or selected_mode.startswith("이미지 분석")
+        is_file_mode = selected_mode in _MODE_FILE_FILTERS
+        # 파일 모드 여부가 그대로면 (예: 대화 → 요약) 위젯 가시성과 경로를 다시 설정하지 않습니다.
+        if is_file_mode == self._last_file_mode and not initial_call:
+            return
+        self._last_file_mode = is_file_mode
 
         # 파일명 라벨(label_4), 파일 경로 입력창(lineEdit_file), 업로드 버튼(pushButton_2) 위젯의 존재 여부 확인
         has_file_widgets = (
@@ -362,45 +1235,26 @@ class GeminiChatApp(QDialog):
         selected_mode = self.comboBox.currentText()
         
         if not self.client:
-            self.txtBrowserResult.setText("❌ API 클라이언트가 초기화되지 않았습니다. API 키를 확인하세요.")
-            return
+            if not self._client_connecting:
+                self._set_log("❌ API 클라이언트가 초기화되지 않았습니다. API 키를 확인하세요.")
+                return
+            if not selected_mode.startswith("대화"):
+                self._append_log("\n\n[System]: ⏳ Gemini AI에 연결하는 중입니다. 잠시 후 다시 시도하세요.")
+                return
         
-        if input_text and any(keyword in input_text for keyword in ["지워줘", "삭제", "취소"]):
+        if input_text and _DELETE_RE.search(input_text):
             self.delete_last_entry()
             return
         
-        if selected_mode.startswith("대화"):
-            self.send_question(input_text)
-        elif selected_mode.startswith("검색"):
-            self.search_history(input_text)
-        elif selected_mode.startswith("요약"):
-            self.handle_summarize(input_text)
-        elif selected_mode.startswith("코딩"):
-            self.handle_code_generation(input_text)
-        elif selected_mode.startswith("웹 검색"):
-            self.handle_web_search(input_text)
-        elif selected_mode.startswith("기억 관리"):
-            self.handle_fact_management(input_text)
-        elif selected_mode.startswith("데이터 분석"):
-            self.handle_data_analysis(input_text)
-        elif selected_mode.startswith("이미지 분석"):
-            self.handle_image_analysis(input_text)
-        elif selected_mode.startswith("에이전트 워크플로우"):
-            self.handle_agent_workflow(input_text)
+        handler = self._mode_handlers.get(selected_mode)
+        if handler:
+            handler(input_text)
         else:
-            self.txtBrowserResult.setText("모드를 선택해주세요.")
+            self._set_log("모드를 선택해주세요.")
 
     def handle_upload_file(self):
         """파일 업로드 다이얼로그를 열고 경로를 lineEdit_file에 설정합니다."""
-        selected_mode = self.comboBox.currentText()
-        
-        if selected_mode.startswith("이미지 분석"):
-            file_filter = "Images (*.png *.jpg *.jpeg *.bmp *.webp)"
-        elif selected_mode.startswith("데이터 분석"):
-            # CSV, 텍스트 등 데이터 파일 형식을 지원
-            file_filter = "Data Files (*.csv *.txt *.json);;Images (*.png *.jpg *.jpeg);;All Files (*)"
-        else:
-            file_filter = "All Files (*)"
+        file_filter = _MODE_FILE_FILTERS.get(self.comboBox.currentText(), "All Files (*)")
 
         file_path, _ = QFileDialog.getOpenFileName(
             self,
@@ -412,148 +1266,359 @@ class GeminiChatApp(QDialog):
         if file_path:
             self.image_path = file_path # 내부 변수에도 저장
             self.lineEdit_file.setText(file_path) # UI에 경로 표시
-            self.txtBrowserResult.append(f"\n\n[System]: 📎 파일 경로 설정 완료: **{os.path.basename(file_path)}**\n질문을 입력하고 **보내기** 버튼을 누르세요.")
+            self._append_log(f"\n\n[System]: 📎 파일 경로 설정 완료: **{os.path.basename(file_path)}**\n질문을 입력하고 **보내기** 버튼을 누르세요.")
         
         
     def send_question(self, question):
-        """일반 대화 모드: Gemini 채팅 세션 및 DB 저장."""
-        if not self.chat or not question: return
+        """일반 대화 모드: Gemini 채팅 세션 및 DB 저장. (API 호출은 작업 스레드에서 수행)"""
+        if not question: return
+        if not self.chat and not self._client_connecting: return
+        self._clear_input()
+
+        # 연결 준비 중이거나 이전 답변을 생성 중이면 대기열에 넣고, 차례가 되면 보냅니다.
+        if not self.chat or self._chat_busy:
+            self._pending_questions.append(question)
+            reason = "Gemini AI에 연결하는 중" if not self.chat else "이전 질문에 대한 답변을 생성하는 중"
+            self._append_log(f"\n\n[System]: ⏳ {reason}입니다. 차례가 되면 '{question[:30]}' 질문을 보냅니다.")
+            return
+
+        self._start_chat_request(question)
+
+    def _send_next_pending_question(self):
+        """대기열에 질문이 있고 채팅 세션이 쉬고 있으면 다음 질문을 보냅니다."""
+        if self._pending_questions and self.chat and not self._chat_busy:
+            self._start_chat_request(self._pending_questions.pop(0))
+
+    def _start_chat_request(self, question):
+        """질문을 화면에 표시하고 GeminiWorker를 스레드 풀에 제출합니다."""
+        self._append_log(f"\n\n[질문]: {question}")
+        anchor = self._append_pending_line("[fox]: 답변을 생성하는 중... (SQLite 로컬 DB 사용으로 빨라졌습니다!)")
+        self._chat_stream = {'anchor': anchor, 'generation': self._log_generation, 'parts': [], 'started': False, 'length': 0}
+
+        # '답변 캐시 사용' 체크 해제 시 이번 세션에서는 캐시를 조회/저장하지 않습니다.
+        # 대화 답변은 세션 맥락에 따라 달라지므로 입력이 완전히 같아도 메모리 LRU 캐시(_prompt_cache)는 쓰지 않습니다.
+        use_cache = self.checkBox_cache.isChecked()
+        worker = GeminiWorker(self.client, self.chat, question, self.db_handler if use_cache else None)
+        worker.signals.chunk.connect(self._on_answer_chunk)
+        worker.signals.finished.connect(self._on_answer)
+        worker.signals.cached.connect(self._on_cached_answer)
+        worker.signals.error.connect(self._on_answer_error)
+        self._chat_busy = True
+        self._thread_pool.start(worker)
+
+    def _on_answer_chunk(self, text):
+        """스트리밍 답변 조각을 이 답변의 자리에 이어 붙입니다. 첫 조각에서 안내 문구를 지웁니다."""
+        self._stream_text(self._chat_stream, "[fox]: ", text)
+
+    def _on_answer(self, question, final_answer, embedding):
+        """스트리밍이 끝난 답변을 GUI 스레드에서 저장합니다. (화면에는 이미 조각 단위로 출력됨)"""
+        self._chat_busy = False
+        if final_answer: # 빈 응답은 기록·캐시에 남기지 않습니다.
+            self._save_chat_entry(question, final_answer)
+            if embedding is not None:
+                self.db_handler.save_cached_response(question, final_answer, embedding)
+
+        if not self._chat_stream['started']:
+            self._replace_pending_line(self._chat_stream, f"[fox]: {final_answer}")
+        self._send_next_pending_question()
+
+    def _on_cached_answer(self, question, cached_answer):
+        """시맨틱 캐시에서 찾은 답변을 API 호출 없이 화면에 반영합니다."""
+        self._chat_busy = False
+        self._save_chat_entry(question, cached_answer)
+
+        self._replace_pending_line(self._chat_stream, f"[fox]: (💾 저장된 답변) {cached_answer}")
+        self._send_next_pending_question()
+
+    def _on_answer_error(self, question, error_name):
+        """작업 스레드에서 발생한 API 오류를 화면에 표시합니다."""
+        self._chat_busy = False
+        error_message = f"API 호출 중 오류 발생: {api_error_message(error_name)}"
+        if self._chat_stream['started']:
+            self._stream_text(self._chat_stream, None, f"\n[Error]: {error_message}") # 이미 출력된 답변 조각은 남겨 둡니다.
+        else:
+            self._replace_pending_line(self._chat_stream, f"[Error]: {error_message}")
+        self._send_next_pending_question()
+
+    def _start_request(self, contents, config, info):
+        """
+        GeminiRequest를 스레드 풀에 제출합니다. 결과는 GUI 스레드의 _on_request_finished/_on_request_error에서 처리합니다.
+        info: anchor(결과로 바꿀 안내 줄의 커서), generation(anchor를 만든 시점의 로그 세대), save_question(저장할 질문), save_answer(저장할 답변 머리말),
+              title(결과 제목, header로 조립됨), error_label(오류 안내용 모드 이름), clear_file(성공 시 파일 경로 초기화),
+              cache_mode/cache_text(응답 캐시를 쓰는 모드와 그 키가 되는 사용자 입력),
+              semantic_cache(True면 완전 일치 외에 임베딩 유사도 캐시도 조회·저장)
+        """
+        # 웹 검색·워크플로우(실시간 도구 결과)와 이미지 분석(파일 내용)은 cache_mode를 주지 않아 캐시하지 않습니다.
+        info['header'] = _RESULT_HEADER.format(title=info['title']) # 조각마다 다시 만들지 않도록 미리 한 번만 조립
+        use_cache = 'cache_mode' in info and self.checkBox_cache.isChecked()
+        if use_cache:
+            cached_answer = self._get_prompt_cache(info['cache_mode'], info['cache_text'])
+            if cached_answer is not None:
+                self._on_request_cached(info, cached_answer)
+                return
+        info.update(parts=[], started=False, length=0) # info는 이 요청의 스트림 상태도 겸합니다.
+        semantic = use_cache and info.get('semantic_cache', False)
+        request = GeminiRequest(self.client, self.model, contents, config, info, self.db_handler if semantic else None)
+        request.signals.chunk.connect(self._on_request_chunk)
+        request.signals.finished.connect(self._on_request_finished)
+        request.signals.cached.connect(self._on_request_cached)
+        request.signals.error.connect(self._on_request_error)
+        self._thread_pool.start(request)
+
+    def _on_request_chunk(self, info, text):
+        """단발 요청의 스트리밍 조각을 이어 붙입니다. 첫 조각에서 안내 줄을 결과 제목으로 바꿉니다."""
+        self._stream_text(info, info['header'], text)
+
+    def _on_request_finished(self, info, answer, embedding):
+        """단발 요청의 답변을 저장합니다. 조각이 하나도 오지 않았으면 안내 줄을 결과로 바꿉니다."""
+        if answer: # 빈 응답은 기록·캐시에 남기지 않습니다. (전문 검색이 답변 전체를 찾도록 자르지 않고 저장)
+            self._save_chat_entry(info['save_question'], f"{info['save_answer']} {answer}")
+            if 'cache_mode' in info:
+                self._put_prompt_cache(info['cache_mode'], info['cache_text'], answer)
+            if embedding is not None:
+                self.db_handler.save_cached_response(info['cache_text'], answer, embedding, info['cache_mode'])
+
+        if not info['started']:
+            self._replace_pending_line(info, info['header'] + answer)
+        if info.get('clear_file'):
+            self.lineEdit_file.setText("") # 사용 후 파일 경로 초기화
+
+    def _on_request_cached(self, info, cached_answer):
+        """시맨틱 캐시에서 찾은 답변을 API 호출 없이 결과로 표시합니다."""
+        self._save_chat_entry(info['save_question'], f"{info['save_answer']} {cached_answer}")
+        self._put_prompt_cache(info['cache_mode'], info['cache_text'], cached_answer)
+
+        self._replace_pending_line(info, _CACHED_RESULT_HEADER.format(title=info['title']) + cached_answer)
+
+    def _on_request_error(self, info, error_name):
+        """단발 요청의 API 오류를 '처리하는 중...' 안내 줄 자리(이미 출력된 조각이 있으면 그 뒤)에 표시합니다."""
+        error_message = f"[Error]: {info['error_label']} API 호출 중 오류 발생: {api_error_message(error_name)}"
+        if info.get('started'):
+            self._stream_text(info, None, "\n" + error_message)
+        else:
+            self._replace_pending_line(info, error_message)
+
+    def _prompt_cache_key(self, mode, text):
+        """(모드, 입력)을 blake2b 16바이트 다이제스트 키로 만듭니다."""
+        return hashlib.blake2b(f"{mode}\0{text}".encode(), digest_size=16).digest()
+
+    def _get_prompt_cache(self, mode, text):
+        """입력이 완전히 같은 이전 답변을 반환합니다. 없으면 None. (적중 항목은 가장 최근으로 이동)"""
+        key = self._prompt_cache_key(mode, text)
+        answer = self._prompt_cache.get(key)
+        if answer is not None:
+            self._prompt_cache.move_to_end(key)
+        return answer
+
+    def _put_prompt_cache(self, mode, text, answer):
+        """답변을 LRU 캐시에 넣고, 크기를 넘으면 가장 오래 쓰지 않은 항목을 버립니다."""
+        if not answer:
+            return
+        key = self._prompt_cache_key(mode, text)
+        self._prompt_cache[key] = answer
+        self._prompt_cache.move_to_end(key)
+        if len(self._prompt_cache) > PROMPT_CACHE_SIZE:
+            self._prompt_cache.popitem(last=False)
+
+    def _append_pending_line(self, text):
+        """
+        '...하는 중' 안내 줄을 로그 끝에 새 줄로 출력하고, 그 줄의 시작을 가리키는 QTextCursor를 반환합니다.
+        QTextCursor는 앞쪽 내용이 바뀌어도 위치가 자동으로 보정되므로, 그 사이 다른 출력이 붙어도 이 줄을 찾아갑니다.
+        """
+        self._queue_text("\n" + text)
+        self._flush_text()
+        anchor = QTextCursor(self.txtBrowserResult.document())
+        anchor.movePosition(QTextCursor.End)
+        anchor.movePosition(QTextCursor.StartOfBlock)
+        return anchor
+
+    def _replace_pending_line(self, slot, text):
+        """
+        slot['anchor']가 가리키는 안내 줄만 text로 바꾸고, 삽입한 길이(문서 위치 단위)를 반환합니다.
+        toPlainText()로 전체 로그를 복사해 setText 하지 않으며, anchor는 바꾼 내용의 시작에 그대로 둡니다.
+        그 사이 결과창이 검색 결과 등으로 통째로 바뀌었으면(로그 세대가 다르면) 안내 줄이 없으므로 로그 끝에 덧붙입니다.
+        """
+        self._flush_text()
+        anchor = slot['anchor']
+        if self._is_lost(slot):
+            start = self._relocate(slot, text)
+            return self._document_end() - start
+        anchor.movePosition(QTextCursor.StartOfBlock)
+        start = anchor.position()
+        follow = self._is_scrolled_to_end()
+        anchor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+        anchor.insertText(text)
+        inserted = anchor.position() - start
+        anchor.setPosition(start)
+        if follow:
+            self._scroll_to_end()
+        return inserted
+
+    def _stream_text(self, stream, header, text):
+        """
+        스트리밍 조각을 stream['anchor'] 기준 자기 답변 뒤에 이어 붙이도록 버퍼에 쌓습니다. (33ms마다 한 번에 삽입)
+        첫 조각이면 먼저 안내 줄을 header로 바꿉니다.
+        삽입 위치는 (답변 시작 커서 + 지금까지 삽입한 길이)로 계산합니다. 시작 커서는 뒤쪽 출력의 영향을 받지 않으므로,
+        그 사이 다른 요청이나 안내 메시지가 로그 끝에 붙어도 조각이 섞이지 않습니다.
+        """
+        if not stream['started']:
+            stream['length'] = self._replace_pending_line(stream, header)
+            stream['header'] = header # 결과창이 통째로 바뀌면 _flush_text가 로그 끝에 다시 쓸 머리말
+            stream['started'] = True
+        stream['parts'].append(text)
+        self._active_streams[id(stream)] = stream
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _document_end(self):
+        """결과창 문서의 마지막 삽입 가능 위치를 반환합니다."""
+        return self.txtBrowserResult.document().characterCount() - 1
+
+    def _append_block_at_end(self, text):
+        """text를 로그 끝에 새 줄로 바로 붙이고, 그 시작 위치를 반환합니다."""
+        cursor = QTextCursor(self.txtBrowserResult.document())
+        cursor.movePosition(QTextCursor.End)
+        if not self.txtBrowserResult.document().isEmpty():
+            cursor.insertText("\n")
+        start = cursor.position()
+        cursor.insertText(text)
+        return start
+
+    def _is_lost(self, slot):
+        """slot의 anchor가 그 뒤 _set_log로 결과창이 통째로 바뀌기 전에 만들어졌는지 반환합니다."""
+        return slot['generation'] != self._log_generation
+
+    def _relocate(self, slot, text):
+        """자리를 잃은 slot을 위해 text를 로그 끝에 새 줄로 쓰고, anchor와 세대를 그 자리로 옮긴 뒤 시작 위치를 반환합니다."""
+        start = self._append_block_at_end(text)
+        slot['anchor'].setPosition(start)
+        slot['generation'] = self._log_generation
+        return start
+
+    def _set_log(self, text):
+        """
+        결과창 내용을 text로 통째로 바꿉니다. 결과창의 setText는 모두 여기를 거쳐야 합니다.
+        로그 세대를 올려, 진행 중인 요청이 옛 anchor 자리(이제는 문서 끝으로 밀려난 위치)에 답변을 쓰지 않게 합니다.
+        """
+        self._log_generation += 1
+        self.txtBrowserResult.setText(text)
+
+    def _clear_input(self):
+        """
+        입력창을 비웁니다. textChanged를 막아 검색 디바운스 슬롯이 불필요하게 호출되지 않게 하고,
+        그 슬롯이 하던 대로 예약된 실시간 검색만 취소합니다.
+        """
+        self.lineEdit.blockSignals(True)
         self.lineEdit.clear()
-        
-        new_entry = f"\n\n[질문]: {question}\n[fox]: 답변을 생성하는 중... (SQLite 로컬 DB 사용으로 빨라졌습니다!)"
-        self.txtBrowserResult.append(new_entry)
-        self.txtBrowserResult.ensureCursorVisible()
-        QApplication.processEvents()
+        self.lineEdit.blockSignals(False)
+        self._search_timer.stop()
 
-        try:
-            response = self.chat.send_message(question)
-            final_answer = response.text.strip()
-            
-            self.db_handler.save_chat_entry(question, final_answer)
+    def _append_log(self, text):
+        """QTextBrowser.append와 같이 새 문단으로 출력합니다. (버퍼를 거쳐 그려짐)"""
+        if self._pending_text or not self.txtBrowserResult.document().isEmpty():
+            text = "\n" + text
+        self._queue_text(text)
 
-            updated_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[fox]: {final_answer}"
-            self.txtBrowserResult.setText(updated_log)
-            self.txtBrowserResult.ensureCursorVisible()
+    def _queue_text(self, text):
+        """출력할 텍스트를 버퍼에 쌓아 두고, 타이머가 돌지 않으면 시작합니다."""
+        self._pending_text.append(text)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
 
-        except Exception as e:
-            error_message = f"API 호출 중 오류 발생: {type(e).__name__}"
-            current_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0]
-            updated_log = current_log + f"\n[Error]: {error_message}"
-            self.txtBrowserResult.setText(updated_log)
-            print(f"API Error: {e}")
+    def _flush_text(self):
+        """
+        버퍼에 쌓인 스트리밍 조각은 각자의 자리에, 나머지 출력은 한 번의 insertText로 로그 끝에 붙이고 타이머를 멈춥니다.
+        답변 도중 결과창이 검색 결과 등으로 통째로 바뀌었으면(로그 세대가 다르면), 로그 끝에 머리말을 다시 쓰고 거기서 이어 붙입니다.
+        """
+        self._flush_timer.stop()
+        follow = self._is_scrolled_to_end()
+        for stream in self._active_streams.values():
+            start = stream['anchor'].position()
+            if self._is_lost(stream):
+                start = self._relocate(stream, stream['header'])
+                stream['length'] = self._document_end() - start
+            cursor = QTextCursor(self.txtBrowserResult.document())
+            cursor.setPosition(min(start + stream['length'], self._document_end()))
+            cursor.insertText("".join(stream['parts']))
+            stream['parts'].clear()
+            stream['length'] = cursor.position() - start
+        self._active_streams.clear()
+        if self._pending_text:
+            text = "".join(self._pending_text)
+            self._pending_text.clear()
+            cursor = QTextCursor(self.txtBrowserResult.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
+        if follow:
+            self._scroll_to_end()
+
+    def _is_scrolled_to_end(self):
+        """결과창이 맨 아래까지 스크롤되어 있는지 반환합니다. (사용자가 위로 올려 읽는 중이면 False)"""
+        bar = self.txtBrowserResult.verticalScrollBar()
+        return bar.value() >= bar.maximum()
+
+    def _scroll_to_end(self):
+        """
+        결과창을 맨 아래로 스크롤합니다.
+        출력은 위젯 커서가 아닌 별도 QTextCursor로 넣으므로 ensureCursorVisible()로는 스크롤되지 않습니다.
+        """
+        bar = self.txtBrowserResult.verticalScrollBar()
+        bar.setValue(bar.maximum())
 
     def handle_image_analysis(self, question):
         """이미지 파일 경로를 사용하여 멀티모달 분석을 수행합니다."""
         if not self.client: return
         
         image_path = self.lineEdit_file.text().strip()
-        if not image_path or not os.path.exists(image_path):
-            self.txtBrowserResult.setText("⚠️ 이미지 분석 모드: '업로드' 버튼을 눌러 이미지 파일을 선택하거나, 경로를 확인하세요.")
+        try:
+            is_readable = bool(image_path) and os.stat(image_path).st_size > 0 # mmap은 빈 파일을 열 수 없음
+        except OSError:
+            is_readable = False
+        if not is_readable:
+            self._set_log("⚠️ 이미지 분석 모드: '업로드' 버튼을 눌러 이미지 파일을 선택하거나, 경로를 확인하세요.")
             return
 
         if not question:
             question = "이 이미지를 자세히 설명해줘."
             
-        self.lineEdit.clear()
+        self._clear_input()
         
         question_display = f"**[이미지 분석 요청]:** {question[:100]}..."
-        new_entry = f"\n\n{question_display}\n[fox]: 🖼️ 파일 **{os.path.basename(image_path)}**을(를) 분석하는 중..."
-        self.txtBrowserResult.append(new_entry)
-        QApplication.processEvents()
-        
-        try:
-            # 1. 파일에서 바이트 읽기
-            with open(image_path, 'rb') as f:
-                image_bytes = f.read()
+        self._append_log(f"\n\n{question_display}")
+        anchor = self._append_pending_line(f"[fox]: 🖼️ 파일 **{os.path.basename(image_path)}**을(를) 분석하는 중...")
                 
-            # 2. MIME 타입 추정 (확장자 기반)
-            ext = os.path.splitext(image_path)[1].lower()
-            if ext in ['.png', '.webp']:
-                mime_type = f'image/{ext[1:]}'
-            elif ext in ['.jpg', '.jpeg']:
-                mime_type = 'image/jpeg'
-            else:
-                mime_type = 'image/jpeg' # 기본값
-            
-            # 3. Gemini Part 생성
-            image_data = types.Part.from_bytes(image_bytes, mime_type=mime_type)
-            contents = [image_data, question]
-            
-            # 4. API 호출
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents
-            )
-            final_response = response.text.strip()
-            
-            # 5. DB 저장
-            self.db_handler.save_chat_entry(f"[이미지 분석 요청] {question}", f"[이미지 분석 응답] {final_response}")
-
-            # 6. UI 업데이트
-            updated_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[fox]: ✅ **이미지 분석 결과**\n{final_response}"
-            self.txtBrowserResult.setText(updated_log)
-            self.lineEdit_file.setText("") # 사용 후 파일 경로 초기화
-
-        except FileNotFoundError:
-            error_message = f"❌ 파일 '{image_path}'을(를) 찾을 수 없습니다."
-            self.txtBrowserResult.append(f"\n[Error]: {error_message}")
-        except Exception as e:
-            error_message = f"이미지 분석 API 호출 중 오류 발생: {type(e).__name__}"
-            current_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0]
-            updated_log = current_log + f"\n[Error]: {error_message}"
-            self.txtBrowserResult.setText(updated_log)
-
-    def handle_agent_workflow(self, workflow_prompt):
-        """에이전트 워크플로우: 다단계 작업 처리 및 DB 저장."""
-        if not self.client or not workflow_prompt:
-            self.txtBrowserResult.setText("⚠️ 에이전트 워크플로우: 다단계 작업을 정의하세요.")
-            return
-
-        self.lineEdit.clear()
+        # MIME 타입 추정 (확장자 기반, 알 수 없으면 JPEG)
+        mime_type = mimetypes.guess_type(image_path)[0] or 'image/jpeg'
         
-        question_display = f"**[에이전트 워크플로우 요청]:** {workflow_prompt[:100]}..."
-        new_entry = f"\n\n{question_display}\n[fox]: ⚙️ 워크플로우를 분석하고 실행합니다. (Google Search 포함 가능)"
-        self.txtBrowserResult.append(new_entry)
-        QApplication.processEvents()
-        
-        system_prompt = (
-            "당신은 다단계 작업을 처리하는 에이전트입니다. 사용자의 요청을 '단계별'로 분해하고 순차적으로 처리하세요.\n"
-            "각 단계의 결과를 다음 단계의 입력으로 사용해야 합니다. 최종 결과만 출력합니다.\n"
-            "웹 검색이 필요한 단계에는 Google Search Tool을 사용하세요."
-        )
-
-        try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=workflow_prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    tools=[{"googleSearch": {}}]
-                )
-            )
-            final_response = response.text.strip()
-            
-            self.db_handler.save_chat_entry(f"[워크플로우 요청] {workflow_prompt}", f"[워크플로우 응답] {final_response}")
-
-            updated_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[fox]: ✅ **워크플로우 최종 결과**\n{final_response}"
-            self.txtBrowserResult.setText(updated_log)
-
-        except Exception as e:
-            error_message = f"워크플로우 API 호출 중 오류 발생: {type(e).__name__}"
-            current_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0]
-            updated_log = current_log + f"\n[Error]: {error_message}"
-            self.txtBrowserResult.setText(updated_log)
+        # 파일 읽기, Gemini Part 생성, API 호출은 모두 작업 스레드에서 수행
+        self._start_request(lambda: [load_image_part(image_path, mime_type), question], None, {
+            'anchor': anchor,
+            'generation': self._log_generation,
+            'save_question': f"[이미지 분석 요청] {question}",
+            'save_answer': "[이미지 분석 응답]",
+            'title': "이미지 분석 결과",
+            'error_label': "이미지 분석",
+            'clear_file': True,
+        })
 
     # ----------------------------------------------------------------------
-    # 6. 보조 기능 핸들러 (Utility Handlers - DB 사용)
+    # 7. 보조 기능 핸들러 (Utility Handlers - DB 사용)
     # ----------------------------------------------------------------------
+    def _save_chat_entry(self, question, answer):
+        """기록을 DB 쓰기 대기열에 넣고, 배치 커밋 타이머가 돌지 않으면 시작합니다."""
+        self.db_handler.save_chat_entry(question, answer)
+        self._search_cache.clear()
+        if not self._db_flush_timer.isActive():
+            self._db_flush_timer.start()
+
     def delete_last_entry(self):
         """가장 최근 기록 삭제 및 UI 업데이트."""
         record_id = self.db_handler.delete_last_entry()
+        self._search_cache.clear()
         if record_id is not None:
-            self.txtBrowserResult.append(f"\n\n[System]: ✅ 가장 최근 기록(ID: {record_id})이 SQLite DB에서 삭제되었습니다.")
+            self._append_log(f"\n\n[System]: ✅ 가장 최근 기록(ID: {record_id})이 SQLite DB에서 삭제되었습니다.")
         else:
-            self.txtBrowserResult.append("\n\n[System]: ⚠️ 삭제할 기록이 없거나 DB 오류가 발생했습니다.")
+            self._append_log("\n\n[System]: ⚠️ 삭제할 기록이 없거나 DB 오류가 발생했습니다.")
             
     def handle_fact_management(self, command):
         """기억 관리 로직 (팩트 추가/삭제/보기/재설정)"""
@@ -568,21 +1633,21 @@ class GeminiChatApp(QDialog):
             try:
                 key, value = command_parts[1].split('=', 1)
                 if self.db_handler.add_or_update_fact(key.strip(), value.strip()):
-                    self.txtBrowserResult.setText(f"\n\n[System]: ✅ 팩트 업데이트 성공: '{key}'가 '{value}'로 설정되었습니다.")
-                    self.reset_chat_session()
+                    self._set_log(f"\n\n[System]: ✅ 팩트 업데이트 성공: '{key}'가 '{value}'로 설정되었습니다.")
+                    self._mark_facts_dirty()
                 else:
-                    self.txtBrowserResult.setText("\n\n[System]: ❌ 팩트 업데이트 실패. DB 연결을 확인하세요.")
+                    self._set_log("\n\n[System]: ❌ 팩트 업데이트 실패. DB 연결을 확인하세요.")
             except ValueError:
-                self.txtBrowserResult.setText("\n\n[System]: ❌ 잘못된 형식입니다. 사용법: 추가 키=값 (예: 추가 직업=개발자)")
+                self._set_log("\n\n[System]: ❌ 잘못된 형식입니다. 사용법: 추가 키=값 (예: 추가 직업=개발자)")
             return
             
         elif action == "삭제" and len(command_parts) > 1:
             key = command_parts[1].strip()
             if self.db_handler.delete_fact(key):
-                self.txtBrowserResult.setText(f"\n\n[System]: ✅ 팩트 삭제 성공: '{key}'가 삭제되었습니다.")
-                self.reset_chat_session()
+                self._set_log(f"\n\n[System]: ✅ 팩트 삭제 성공: '{key}'가 삭제되었습니다.")
+                self._mark_facts_dirty()
             else:
-                self.txtBrowserResult.setText(f"\n\n[System]: ⚠️ 팩트 삭제 실패: 키 '{key}'를 찾을 수 없습니다.")
+                self._set_log(f"\n\n[System]: ⚠️ 팩트 삭제 실패: 키 '{key}'를 찾을 수 없습니다.")
             return
 
         elif action == "재설정" and len(command_parts) == 1:
@@ -590,7 +1655,7 @@ class GeminiChatApp(QDialog):
             return
             
         else:
-            self.txtBrowserResult.setText("\n\n[System]: 🧠 **기억 관리 모드 명령어**\n"
+            self._set_log("\n\n[System]: 🧠 **기억 관리 모드 명령어**\n"
                                              " - 팩트 보기: '보기' 입력 (기본값)\n"
                                              " - 팩트 추가/수정: '추가 키=값' (예: 추가 취미=독서)\n"
                                              " - 팩트 삭제: '삭제 키' (예: 삭제 취미)\n"
@@ -605,157 +1670,124 @@ class GeminiChatApp(QDialog):
             facts_text_list = [f"{key.replace('_', ' ').title()}: {value}" for key, value in facts_map.items()]
             fact_text = "\n".join(facts_text_list)
             
-        self.txtBrowserResult.setText(f"\n\n[System]: 🧠 **현재 AI가 기억하는 사용자 팩트 목록 (SQLite)**\n"
+        self._set_log(f"\n\n[System]: 🧠 **현재 AI가 기억하는 사용자 팩트 목록 (SQLite)**\n"
                                          f"--- (키: 값) ---\n"
                                          f"{fact_text}\n"
                                          f"----------------\n"
                                          f"팩트를 수정하려면 '기억 관리' 모드에서 '추가 키=값' 또는 '삭제 키' 명령을 사용하세요.")
 
+    def _mark_facts_dirty(self):
+        """팩트가 바뀌었음을 표시하고, 재설정 타이머를 다시 시작합니다."""
+        self._facts_dirty = True
+        self._facts_reset_timer.start()
+
+    def _flush_fact_changes(self):
+        """마지막 팩트 수정 후 대기 시간이 지나면 세션을 한 번만 재설정합니다."""
+        if self._facts_dirty:
+            self.reset_chat_session()
+
     def reset_chat_session(self):
-        """Gemini 채팅 세션을 완전히 재시작하여 새로운 팩트 컨텍스트를 적용"""
+        """Gemini 채팅 세션을 새로 만들어 새로운 팩트 컨텍스트를 적용 (Client는 재사용)"""
+        self._facts_dirty = False
+        self._facts_reset_timer.stop()
         self.user_facts = self.db_handler.get_contextual_facts()
-        self.init_gemini_client()
-        self.txtBrowserResult.append("\n\n[System]: 🔄 **대화 세션 재설정 완료.**\n새로운 사용자 팩트(기억)가 Gemini AI에 적용되었습니다.")
+        self.init_gemini_client() # 완료 안내는 새 세션이 준비되면 _on_client_ready에서 표시
 
     def search_history(self, search_term):
         """SQLite DB에서 대화 기록을 검색합니다."""
         if not search_term:
-            self.txtBrowserResult.setText("⚠️ 검색어를 입력해주세요.")
+            self._set_log("⚠️ 검색어를 입력해주세요.")
             return
 
-        self.lineEdit.clear()
-        self.txtBrowserResult.setText(f"🔍 '{search_term}' 검색 결과:\n" + "="*50)
-            
-        results = self.db_handler.search_history_by_keyword(search_term)
-
-        if results:
-            display_text = ""
-            for row in results:
-                display_text += "\n" + "="*50 + "\n"
-                display_text += f"날짜: {row['created_at']}\n"
-                display_text += f"질문: {row['question'][:100]}{'...' if len(row['question']) > 100 else ''}\n"
-                display_text += f"답변: {row['answer'][:200]}{'...' if len(row['answer']) > 200 else ''}"
-            
-            self.txtBrowserResult.setText(self.txtBrowserResult.toPlainText() + display_text)
-
-        else:
-            self.txtBrowserResult.setText(self.txtBrowserResult.toPlainText() + f"\n\n❌ '{search_term}'과 일치하는 대화 기록을 찾을 수 없습니다.")
+        self._clear_input() # Enter로 바로 검색하면 대기 중인 실시간 검색도 취소됨
+        self._show_search_results(search_term)
 
-    # ----------------------------------------------------------------------
-    # 7. 기타 보조 기능 (API 호출 및 DB 저장)
-    # ----------------------------------------------------------------------
-    def handle_summarize(self, text_to_summarize):
-        if not self.client or not text_to_summarize:
-            self.txtBrowserResult.setText("⚠️ 요약할 텍스트를 입력해주세요.")
+    def _schedule_search(self, text):
+        """'검색' 모드에서 입력이 바뀔 때마다 디바운스 타이머를 다시 시작합니다."""
+        if not self.comboBox.currentText().startswith("검색") or not text.strip():
+            self._search_timer.stop()
             return
+        self._search_timer.start()
 
-        self.lineEdit.clear()
-        
-        self.txtBrowserResult.append(f"\n\n[요약 요청]: {text_to_summarize[:100]}...\n[fox]: 📝 텍스트를 요약하는 중...")
-        QApplication.processEvents()
+    def _run_search(self):
+        """입력이 멈춘 뒤 현재 입력값으로 검색합니다. (입력창은 비우지 않음)"""
+        search_term = self.lineEdit.text().strip()
+        if search_term:
+            self._show_search_results(search_term)
 
-        try:
-            prompt = f"다음 텍스트를 핵심만 간결하게 요약하세요: {text_to_summarize}"
-            response = self.client.models.generate_content(model=self.model, contents=prompt)
-            final_summary = response.text.strip()
-            
-            self.db_handler.save_chat_entry(f"[요약 요청] {text_to_summarize[:100]}...", f"[요약 응답] {final_summary}") 
+    def _get_search_results(self, search_term):
+        """최근 검색 결과가 유효하면 재사용하고, 아니면 DB를 조회해 메모합니다."""
+        cached = self._search_cache.get(search_term)
+        if cached and time.monotonic() - cached[1] < SEARCH_CACHE_TTL:
+            return cached[0]
 
-            updated_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[fox]: ✅ **요약 결과**\n{final_summary}"
-            self.txtBrowserResult.setText(updated_log)
-        except Exception as e:
-            error_message = f"요약 API 호출 중 오류 발생: {type(e).__name__}"
-            self.txtBrowserResult.setText(self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[Error]: {error_message}")
-
-    def handle_code_generation(self, prompt):
-        if not self.client or not prompt:
-            self.txtBrowserResult.setText("⚠️ 생성할 코드를 설명해주세요.")
-            return
-
-        self.lineEdit.clear()
-        
-        self.txtBrowserResult.append(f"\n\n[코드 요청]: {prompt[:100]}...\n[fox]: 🧑‍💻 코드를 생성하는 중...")
-        QApplication.processEvents()
+        results = self.db_handler.search_history_by_keyword(search_term)
+        if len(self._search_cache) >= SEARCH_CACHE_SIZE:
+            self._search_cache.pop(next(iter(self._search_cache)))
+        self._search_cache[search_term] = (results, time.monotonic())
+        return results
 
-        try:
-            system_instruction = "당신은 Python 전문가입니다. 요청에 따라 코드와 설명을 Markdown 코드 블록으로 작성하세요."
-            response = self.client.models.generate_content(
-                model=self.model, 
-                contents=prompt, 
-                config=types.GenerateContentConfig(system_instruction=system_instruction)
-            )
-            final_code = response.text.strip()
+    def _show_search_results(self, search_term):
+        """검색 결과를 결과창에 표시합니다."""
+        header = f"🔍 '{search_term}' 검색 결과:\n" + "="*50
             
-            self.db_handler.save_chat_entry(f"[코드 요청] {prompt[:100]}...", f"[코드 응답] {final_code[:100]}...") 
-
-            updated_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[fox]: ✅ **코드 생성 결과**\n{final_code}"
-            self.txtBrowserResult.setText(updated_log)
-        except Exception as e:
-            error_message = f"코드 API 호출 중 오류 발생: {type(e).__name__}"
-            self.txtBrowserResult.setText(self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[Error]: {error_message}")
-
-    def handle_web_search(self, query):
-        if not self.client or not query:
-            self.txtBrowserResult.setText("⚠️ 웹 검색 키워드를 입력해주세요.")
-            return
-
-        self.lineEdit.clear()
-        
-        self.txtBrowserResult.append(f"\n\n[웹 검색 요청]: {query}\n[fox]: 🌐 웹 검색을 수행하는 중...")
-        QApplication.processEvents()
+        results = self._get_search_results(search_term)
 
-        try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=query,
-                config=types.GenerateContentConfig(
-                    tools=[{"googleSearch": {}}]
-                )
+        if results:
+            # 문자열 += 반복 대신 한 번의 join으로 결과 텍스트를 만듭니다. (미리보기 자르기는 SQL에서 처리)
+            separator = "\n" + "="*50 + "\n"
+            display_text = "".join(
+                f"{separator}날짜: {row['created_at']}\n질문: {row['question']}\n답변: {row['answer']}"
+                for row in results
             )
-            final_result = response.text.strip()
-            
-            self.db_handler.save_chat_entry(f"[웹 검색 요청] {query}", f"[웹 검색 응답] {final_result[:100]}...") 
+            self._set_log(header + display_text)
 
-            updated_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[fox]: ✅ **웹 검색 결과**\n{final_result}"
-            self.txtBrowserResult.setText(updated_log)
-        except Exception as e:
-            error_message = f"웹 검색 API 호출 중 오류 발생: {type(e).__name__}"
-            self.txtBrowserResult.setText(self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[Error]: {error_message}")
-            
-    def handle_data_analysis(self, prompt):
-        if not self.client or not prompt:
-            self.txtBrowserResult.setText("⚠️ 분석할 데이터(표, 리스트 등)와 질문을 함께 입력해주세요.")
-            return
+        else:
+            self._set_log(header + f"\n\n❌ '{search_term}'과 일치하는 대화 기록을 찾을 수 없습니다.")
 
-        self.lineEdit.clear()
-        
-        self.txtBrowserResult.append(f"\n\n[데이터 분석 요청]: {prompt[:100]}...\n[fox]: 📊 데이터 분석을 수행하는 중...")
-        QApplication.processEvents()
+    # ----------------------------------------------------------------------
+    # 8. 기타 보조 기능 (API 호출 및 DB 저장)
+    # ----------------------------------------------------------------------
+    def _run_llm_task(self, mode, text):
+        """
+        _LLM_TASKS[mode] 설정대로 단발 요청을 보냅니다.
+        요청 줄과 안내 줄을 출력한 뒤 _start_request로 넘기며, 결과 표시와 DB 저장은 공통 슬롯에서 처리합니다.
+        """
+        task = _LLM_TASKS[mode]
+        if not self.client or not text:
+            self._set_log(task['empty_message'])
+            return
 
-        try:
-            system_instruction = "당신은 데이터 분석 전문가입니다. 주어진 데이터를 분석하고 사용자의 질문에 답변하세요. 통계적 사실은 굵은 글씨로 강조하세요."
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(system_instruction=system_instruction)
-            )
-            final_analysis = response.text.strip()
-            
-            self.db_handler.save_chat_entry(f"[데이터 분석 요청] {prompt[:100]}...", f"[데이터 분석 응답] {final_analysis[:100]}...") 
+        self._clear_input()
 
-            updated_log = self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[fox]: ✅ **데이터 분석 결과**\n{final_analysis}"
-            self.txtBrowserResult.setText(updated_log)
-        except Exception as e:
-            error_message = f"데이터 분석 API 호출 중 오류 발생: {type(e).__name__}"
-            self.txtBrowserResult.setText(self.txtBrowserResult.toPlainText().rsplit('\n', 1)[0] + f"\n[Error]: {error_message}")
+        self._append_log("\n\n" + task['log'].format(text=text, head=text[:100]))
+        anchor = self._append_pending_line(task['pending'])
 
+        info = {
+            'anchor': anchor,
+            'generation': self._log_generation,
+            'save_question': task['save_question'].format(text=text),
+            'save_answer': task['save_answer'],
+            'title': task['title'],
+            'error_label': task['error_label'],
+        }
+        # 웹 검색·워크플로우는 실시간 도구 결과라 캐시하지 않습니다.
+        if task['cache']:
+            info.update(cache_mode=mode, cache_text=text, semantic_cache=task['semantic_cache'])
+        config = get_request_config(task['system_instruction'], task['web_search'])
+        self._start_request(task['prompt'].format(text=text), config, info)
 
 # ----------------------------------------------------------------------
-# 8. 애플리케이션 실행 진입점 (Entry Point)
+# 9. 애플리케이션 실행 진입점 (Entry Point)
 # ----------------------------------------------------------------------
-if __name__ == '__main__':
+def main():
+    """QApplication을 만들고 채팅 창을 띄운 뒤 이벤트 루프를 실행합니다."""
     # 🚨 이 부분을 활성화해야 PyQt5 창이 뜨고 실행이 유지됩니다.
     app = QApplication(sys.argv)
     window = GeminiChatApp()
     window.show()
-    sys.exit(app.exec_())
+    return app.exec_()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'gemini.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Dialog(object):
+    def setupUi(self, Dialog):
+        Dialog.setObjectName("Dialog")
+        Dialog.resize(798, 654)
+        self.pushButton = QtWidgets.QPushButton(Dialog)
+        self.pushButton.setGeometry(QtCore.QRect(620, 550, 161, 31))
+        self.pushButton.setCheckable(False)
+        self.pushButton.setObjectName("pushButton")
+        self.lineEdit = QtWidgets.QLineEdit(Dialog)
+        self.lineEdit.setGeometry(QtCore.QRect(10, 510, 601, 71))
+        self.lineEdit.setObjectName("lineEdit")
+        self.txtBrowserResult = QtWidgets.QTextBrowser(Dialog)
+        self.txtBrowserResult.setEnabled(True)
+        self.txtBrowserResult.setGeometry(QtCore.QRect(10, 20, 601, 471))
+        self.txtBrowserResult.setObjectName("txtBrowserResult")
+        self.myPic = QtWidgets.QLabel(Dialog)
+        self.myPic.setEnabled(True)
+        self.myPic.setGeometry(QtCore.QRect(630, 20, 151, 131))
+        self.myPic.setMouseTracking(False)
+        self.myPic.setTabletTracking(False)
+        self.myPic.setAcceptDrops(False)
+        self.myPic.setAutoFillBackground(False)
+        self.myPic.setText("")
+        self.myPic.setPixmap(QtGui.QPixmap("C:/Users/여우/Desktop/게임/디코/fox.png"))
+        self.myPic.setScaledContents(True)
+        self.myPic.setWordWrap(False)
+        self.myPic.setOpenExternalLinks(False)
+        self.myPic.setObjectName("myPic")
+        self.label_2 = QtWidgets.QLabel(Dialog)
+        self.label_2.setGeometry(QtCore.QRect(630, 160, 151, 21))
+        font = QtGui.QFont()
+        font.setFamily("나눔고딕")
+        font.setPointSize(11)
+        font.setBold(True)
+        font.setWeight(75)
+        self.label_2.setFont(font)
+        self.label_2.setObjectName("label_2")
+        self.comboBox = QtWidgets.QComboBox(Dialog)
+        self.comboBox.setGeometry(QtCore.QRect(620, 510, 161, 31))
+        self.comboBox.setObjectName("comboBox")
+        self.pushButton_2 = QtWidgets.QPushButton(Dialog)
+        self.pushButton_2.setGeometry(QtCore.QRect(620, 600, 161, 31))
+        self.pushButton_2.setCheckable(False)
+        self.pushButton_2.setObjectName("pushButton_2")
+        self.lineEdit_file = QtWidgets.QLineEdit(Dialog)
+        self.lineEdit_file.setEnabled(False)
+        self.lineEdit_file.setGeometry(QtCore.QRect(100, 590, 511, 41))
+        self.lineEdit_file.setObjectName("lineEdit_file")
+        self.checkBox_cache = QtWidgets.QCheckBox(Dialog)
+        self.checkBox_cache.setGeometry(QtCore.QRect(630, 480, 151, 21))
+        self.checkBox_cache.setChecked(True)
+        self.checkBox_cache.setObjectName("checkBox_cache")
+        self.label_4 = QtWidgets.QLabel(Dialog)
+        self.label_4.setGeometry(QtCore.QRect(20, 590, 61, 41))
+        self.label_4.setObjectName("label_4")
+
+        self.retranslateUi(Dialog)
+        QtCore.QMetaObject.connectSlotsByName(Dialog)
+
+    def retranslateUi(self, Dialog):
+        _translate = QtCore.QCoreApplication.translate
+        Dialog.setWindowTitle(_translate("Dialog", "Dialog"))
+        self.pushButton.setText(_translate("Dialog", "보내기"))
+        self.label_2.setText(_translate("Dialog", "        여우"))
+        self.pushButton_2.setText(_translate("Dialog", "업로드"))
+        self.checkBox_cache.setText(_translate("Dialog", "답변 캐시 사용"))
+        self.label_4.setText(_translate("Dialog", " 파일명"))